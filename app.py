@@ -1,33 +1,69 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_restful import Resource, Api
 from flask_swagger_ui import get_swaggerui_blueprint
 import json
-from cross_section_optimiser import CrossSectionOptimizer
-from load_calculator import LoadCaluculator
-from joint_3 import Joint_3
-from joint_1_2_4 import Joints
-from generate_gcode import GCodeGanarator
-from verifier import Verifier
+import os
+import hashlib
+import time
+import tasks
+from jobs import JobManager, JobQueueFull
+from verifier import check_statistics, validate_designs, verify_stream
+from generate_gcode import GCodeGanarator, iter_chunks
+from gcode_batch import plan_batch, iter_batch_zip
+from formats import FormatUnavailable, encode, response_format
+from response_cache import ResponseCache, cached
+from incremental import check_memo
+import metrics
+import materials
+import load_calculator
+from compression import COMPRESS_MIN_SIZE, compress, compressible, gzip_stream, negotiate
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 api = Api(app)
+jobs = JobManager()
+response_cache = ResponseCache()
+
+def formatted(data, calculate):
+    """Runs a calculation task and encodes its results in the format requested by the body."""
+
+    try:
+        name = response_format(data)
+        results = calculate(data)
+    except FormatUnavailable as error:
+        return {"error": str(error)}, 406
+    except ValueError as error:
+        return {"error": str(error)}, 400
+
+    with metrics.stage('serialization'):
+        if name in ('msgpack', 'npz'):
+            body, mimetype = encode(results, name)
+            return Response(body, mimetype=mimetype)
+        return jsonify(results)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Counts the request and its latency under the resource class that handled it."""
+
+    view = app.view_functions.get(request.endpoint)
+    resource = getattr(view, 'view_class', None)
+    name = resource.__name__ if resource else (request.endpoint or 'unknown')
+    metrics.observe_request(name, request.method, response.status_code, time.perf_counter() - g.request_start)
+    return response
     
 class CrossSectionOptimization(Resource):
+    @cached(response_cache, 'cross_section')
     def post(self):
         data = request.get_json()  
         if not data:
             return jsonify({"error": "Invalid input"}), 400
         
-        
-        optimizer = CrossSectionOptimizer(
-            data.get('material', {}),
-            data.get('load', {}),
-            data.get('footprint', {})
-        )
-        
-        return jsonify(optimizer.optimizer())
+        return formatted(data, tasks.cross_section)
         
         # material_attributes = [
         #     'partial_factor', 'density', 'bending_strength', 'shear_strength', 
@@ -51,96 +87,224 @@ class CrossSectionOptimization(Resource):
         #     {key: data.get(key) for key in footprint_attributes}
         # )
         
+class CrossSectionSweep(Resource):
+    @cached(response_cache, 'cross_section/sweep')
+    def post(self):
+        data = request.get_json()
+        if not data:
+            return {"error": "Invalid input"}, 400
+        
+        try:
+            results = tasks.cross_section_sweep(data)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        
+        return jsonify(results)
+
 class LoadCalculation(Resource):
+    @cached(response_cache, 'load_calculator')
     def post(self):
         data = request.get_json() 
         if not data:
             return jsonify({"error": "Invalid input"}), 400
         
-        calculator = LoadCaluculator(
-            data.get('material', {}),
-            data.get('footprint', {})
-        )
-        
-        return jsonify(calculator.calculator())
+        return formatted(data, tasks.load_calculator)
     
 class JointDetail124(Resource):
+    @cached(response_cache, 'joint1-2-4')
     def post(self):
         data = request.get_json()  
         if not data:
             return jsonify({"error": "Invalid input"}), 400
         
-        details = Joints(
-            data.get('footprint', {}),
-            data.get('cross_section', {})
-        )
-        
-        final_result = details.calculate_joint_1() | details.calculate_joint_2() | details.calculate_joint_4() 
-        
-        return jsonify(final_result)
+        return formatted(data, tasks.joint_1_2_4)
     
 class JointDetail3(Resource):
+    @cached(response_cache, 'joint3')
     def post(self):
         data = request.get_json()  
         if not data:
             return jsonify({"error": "Invalid input"}), 400
         
-        details = Joint_3(
-            data.get('material', {}),
-            data.get('cross_section', {})
-        )
-        
-        return jsonify(details.calculate_capacity_and_status_for_graph())
+        return formatted(data, tasks.joint_3)
 
 class DesignVerify(Resource):
+    @cached(response_cache, 'design_verify')
     def post(self):
         data = request.get_json() 
         if not data:
             return jsonify({"error": "Invalid input"}), 400
         
-        acceptables = []
-        for design in data.get('designs'):
-            is_acceptable = Verifier(design.get('material'), design.get('cross_section'), design.get('footprint')).verify_every_design()
-            if is_acceptable:
-                acceptables.append(design)
+        metrics.BATCH_SIZE.observe(len(data.get('designs') or []), 'DesignVerify')
         
-        return jsonify({'acceptable_designs': acceptables})
+        # Opt-in streaming: one NDJSON line per verified design
+        if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+            designs = data.get('designs') or []
+            # Every design is checked before the 200 is sent, errors cannot be reported mid-stream
+            try:
+                validate_designs(designs)
+            except ValueError as error:
+                return {"error": str(error)}, 400
+            
+            lines = (json.dumps(result) + "\n" for result in verify_stream(designs))
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        
+        try:
+            results = tasks.design_verify(data)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        
+        with metrics.stage('serialization'):
+            return jsonify(results)
     
 class GenerateGCode(Resource):
+    @cached(response_cache, 'generate_g_code')
     def post(self):
         data = request.get_json() 
         if not data:
             return jsonify({"error": "Invalid input"}), 400
         
-        tie_beam_w = data.get('tie_beam_w', 20)
-        tie_beam_h = data.get('tie_beam_h', 40)
-        column_h = data.get('column_h', 10)
-        
-        gcode_generator = GCodeGanarator() 
-        gcode_program = gcode_generator.generate_gcode(
-            mortise_width=tie_beam_w,                 # tie_beam Width
-            mortise_height=tie_beam_h,                # tie_beam Height
-            mortise_depth=column_h,                   # Coulmn Height
-            tenon_width=(1/3) * tie_beam_w,           # (1/3) tie_beam Width
-            tenon_height=tie_beam_h,                  # tie_beam Height
-            tenon_length=column_h,                    # Coulmn Height
-            peg_diameter=1,
-            peg_depth=20,
-            tool_diameter=8,
-            feed_rate=1000,
-            spindle_speed=10000,
-            safe_z=10,
+        try:
+            parameters = tasks.gcode_parameters(data)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        
+        # Opt-in streaming: the program is sent as chunked text/plain while it is generated
+        if data.get('stream'):
+            if data.get('cycle_time'):
+                return {"error": "cycle_time needs the whole program, it is not available with stream"}, 400
+            
+            lines = GCodeGanarator().iter_gcode(**parameters)
+            return Response(stream_with_context(iter_chunks(lines)), mimetype='text/plain')
+        
+        return jsonify(tasks.generate_g_code(data))
+
+class GenerateGCodeBatch(Resource):
+    def post(self):
+        data = request.get_json()
+        if not data:
+            return {"error": "Invalid input"}, 400
+        
+        try:
+            manifest, programs = plan_batch(data)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        
+        metrics.BATCH_SIZE.observe(manifest['joint_count'], 'GenerateGCodeBatch')
+        
+        # Each unique joint is generated once, the archive is streamed as the programs come back
+        archive = iter_batch_zip(manifest, programs, workers=data.get('workers'))
+        return Response(
+            stream_with_context(archive),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=gcode.zip'}
         )
+
+class Pipeline(Resource):
+    @cached(response_cache, 'pipeline')
+    def post(self):
+        data = request.get_json()
+        if not data:
+            return {"error": "Invalid input"}, 400
+        
+        try:
+            results = tasks.pipeline(data)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        
+        with metrics.stage('serialization'):
+            return jsonify(results)
+
+class JobList(Resource):
+    def post(self):
+        data = request.get_json()
+        if not data:
+            return {"error": "Invalid input"}, 400
+        
+        try:
+            job = jobs.submit(data.get('endpoint'), data.get('payload') or {})
+        except ValueError as error:
+            return {"error": str(error)}, 400
+        except JobQueueFull as error:
+            return {"error": str(error)}, 503
+        
+        return job.status(), 202, {'Location': f"/jobs/{job.id}"}
+
+class JobDetail(Resource):
+    def get(self, job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return {"error": "Job not found"}, 404
+        
+        return jsonify(job.status())
+    
+    def delete(self, job_id):
+        job = jobs.cancel(job_id)
+        if job is None:
+            return {"error": "Job not found"}, 404
+        
+        return jsonify(job.status())
+
+class JobResult(Resource):
+    def get(self, job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return {"error": "Job not found"}, 404
+        
+        status = job.status()
+        if status['status'] == 'failed':
+            # Invalid input is refused with 400, as by the endpoint itself
+            code = 400 if isinstance(job.exception(), ValueError) else 500
+            return status | {"error": job.error()}, code
+        if status['status'] != 'done':
+            return status, 409
+        
+        return jsonify(job.result())
+
+class MaterialList(Resource):
+    def get(self):
+        return jsonify({'materials': [materials.describe(material_id) for material_id in materials.MATERIAL_INDEX]})
+
+class MaterialDetail(Resource):
+    def get(self, material_id):
+        if material_id not in materials.MATERIAL_INDEX:
+            return {"error": "Material not found"}, 404
         
-        return jsonify(gcode_program)
+        return jsonify(materials.describe(material_id))
+
+def cache_stats():
+    return response_cache.stats() | {
+        'incremental': check_memo.stats(),
+        'short_circuit': check_statistics.stats(),
+        'load_calculator': load_calculator.cache_stats(),
+    }
+
+class CacheStats(Resource):
+    def get(self):
+        return jsonify(cache_stats())
+    
+    def delete(self):
+        response_cache.clear()
+        check_memo.clear()
+        load_calculator.clear_caches()
+        return jsonify(cache_stats())
 
 #api resources 
 api.add_resource(CrossSectionOptimization, '/cross_section')
+api.add_resource(CrossSectionSweep, '/cross_section/sweep')
 api.add_resource(LoadCalculation, '/load_calculator')
 api.add_resource(JointDetail124, '/joint1-2-4')
 api.add_resource(JointDetail3, '/joint3')
 api.add_resource(DesignVerify, '/design_verify')
 api.add_resource(GenerateGCode, '/generate_g_code')
+api.add_resource(GenerateGCodeBatch, '/generate_g_code/batch')
+api.add_resource(Pipeline, '/pipeline')
+api.add_resource(JobList, '/jobs')
+api.add_resource(JobDetail, '/jobs/<string:job_id>')
+api.add_resource(JobResult, '/jobs/<string:job_id>/result')
+api.add_resource(MaterialList, '/materials')
+api.add_resource(MaterialDetail, '/materials/<string:material_id>')
+api.add_resource(CacheStats, '/cache')
 
 
 # Configure Swagger UI
@@ -155,15 +319,64 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 )
 app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 
+# The spec is read once at startup, its serialized and compressed bodies are built on first use
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'swagger.json'), 'r') as f:
+    SWAGGER_SPEC = json.load(f)
+swagger_bodies = {}
+
+def swagger_body(encoding):
+    """Body and strong ETag of the spec in the given content encoding."""
+
+    if encoding not in swagger_bodies:
+        body = app.json.response(SWAGGER_SPEC).get_data()
+        if encoding:
+            body = compress(body, encoding)
+        swagger_bodies[encoding] = body, hashlib.sha256(body).hexdigest()
+    return swagger_bodies[encoding]
+
 @app.route('/swagger.json')
 def swagger():
-    with open('swagger.json', 'r') as f:
-        response = jsonify(json.load(f))
-        # Add CORS headers to the Swagger JSON response
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    encoding = negotiate(request.accept_encodings)
+    body, etag = swagger_body(encoding)
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # Add CORS headers to the Swagger JSON response
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    return response.make_conditional(request)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.after_request
+def compress_response(response):
+    """Compresses responses for clients that accept it, streamed ones chunk by chunk with gzip."""
+
+    if not compressible(response):
+        return response
+
+    if response.is_streamed:
+        if request.accept_encodings['gzip']:
+            response.response = gzip_stream(response.response)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.pop('Content-Length', None)
+            response.vary.add('Accept-Encoding')
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None or response.content_length is None or response.content_length < COMPRESS_MIN_SIZE:
         return response
 
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
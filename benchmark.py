@@ -0,0 +1,217 @@
+"""Benchmarks of the calculation engines over scaling sweeps.
+
+    python benchmark.py --output baseline.json          # record a baseline
+    python benchmark.py --compare baseline.json         # flag regressions against it
+
+Every case is timed repeat times after a warm-up run (the best and the median are kept),
+then run once more under tracemalloc for its peak memory. Caches of the load calculator
+are cleared before every run, so the engines are measured cold.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from cross_section_optimiser import CrossSectionOptimizer
+from generate_gcode import GCodeGanarator
+from incremental import CheckMemo
+from joint_3 import Joint_3
+from load_calculator import LoadCaluculator, calculate_wind_state, _calculate_for_key
+import tasks
+from verifier import BatchVerifier, Verifier
+
+# Timed runs per case
+REPEAT = 5
+
+# Relative slowdown (or memory growth) over the baseline reported as a regression
+THRESHOLD = 0.25
+
+# Runs shorter than this (seconds) are compared on memory only, their timings are mostly noise
+MIN_COMPARED_TIME = 0.001
+
+
+def footprints(count):
+    """Distinct footprints, so no two designs of a batch share a load calculation."""
+
+    return [
+        {'length': 4 + i % 5, 'width': 2 + (i // 5) % 5 * 0.5, 'height': 2 + (i // 25) % 4 * 0.25,
+         'column_number': 6, 'slab_thickness': 0.2 + i * 1e-6}
+        for i in range(count)
+    ]
+
+
+def designs(count):
+    rng = np.random.default_rng(0)
+    return [
+        {'material': {}, 'cross_section': {'beam_w': float(w), 'beam_h': float(t)}, 'footprint': footprint}
+        for w, t, footprint in zip(rng.uniform(0.06, 0.12, count), rng.uniform(0.08, 0.2, count), footprints(count))
+    ]
+
+
+def cross_section_case(step):
+    search = {'widths': {'step': step}, 'thicknesses': {'step': step}}
+    optimizer = CrossSectionOptimizer({}, {}, {}, search)
+    return len(optimizer.widths) * len(optimizer.thicknesses), lambda: CrossSectionOptimizer({}, {}, {}, search).optimizer()
+
+
+def cross_section_edit_case(step):
+    """Incremental optimisations, every run edits the column height so only the column checks are recomputed."""
+
+    search = {'widths': {'step': step}, 'thicknesses': {'step': step}}
+    memo = CheckMemo()
+    edits = itertools.count()
+    optimizer = CrossSectionOptimizer({}, {}, {}, search)
+    return len(optimizer.widths) * len(optimizer.thicknesses), lambda: CrossSectionOptimizer(
+        {}, {}, {'height': 2 + next(edits) * 0.001}, search, memo
+    ).optimizer()
+
+
+def load_calculator_case(count):
+    batch = footprints(count)
+    return count, lambda: [LoadCaluculator({}, footprint).calculator() for footprint in batch]
+
+
+def verifier_case(count):
+    batch = designs(count)
+    return count, lambda: [
+        Verifier(design['material'], design['cross_section'], design['footprint']).verify_every_design()
+        for design in batch
+    ]
+
+
+def batch_verifier_case(count):
+    batch = designs(count)
+    return count, lambda: BatchVerifier(batch).acceptable_designs()
+
+
+def joint_3_case(d_step):
+    joint = Joint_3({}, {}, {'d_step': d_step})
+    return len(joint.diameters()), lambda: Joint_3({}, {}, {'d_step': d_step}).calculate_capacity_and_status_for_graph()
+
+
+def gcode_case(depth, optimized=False):
+    parameters = tasks.gcode_parameters({'column_h': depth, 'optimized': optimized})
+    return depth, lambda: GCodeGanarator().generate_gcode(**parameters)
+
+
+# (engine, swept parameter, values, case); a case returns the problem size and the function to time
+SWEEPS = [
+    ('cross_section', 'step', [0.004, 0.002, 0.001, 0.0005], cross_section_case),
+    ('cross_section_edit', 'step', [0.004, 0.002, 0.001, 0.0005], cross_section_edit_case),
+    ('load_calculator', 'batch', [1, 10, 100], load_calculator_case),
+    ('verifier', 'batch', [10, 100, 1000], verifier_case),
+    ('batch_verifier', 'batch', [100, 1000, 10000], batch_verifier_case),
+    ('joint_3', 'd_step', [0.02, 0.005, 0.001], joint_3_case),
+    ('gcode', 'depth', [10, 100, 1000], gcode_case),
+    ('gcode_optimized', 'depth', [10, 100, 1000], lambda depth: gcode_case(depth, optimized=True)),
+]
+
+
+def clear_caches():
+    calculate_wind_state.cache_clear()
+    _calculate_for_key.cache_clear()
+
+
+def measure(function, repeat):
+    clear_caches()
+    function()
+
+    timings = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    clear_caches()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'time_min': min(timings), 'time_median': statistics.median(timings), 'peak_bytes': peak}
+
+
+def run(engines=None, repeat=REPEAT, quick=False):
+    results = {}
+    for engine, parameter, values, case in SWEEPS:
+        if engines and engine not in engines:
+            continue
+        for value in values[:2] if quick else values:
+            size, function = case(value)
+            name = f"{engine}[{parameter}={value}]"
+            results[name] = {'engine': engine, 'parameter': parameter, 'value': value, 'size': size} | measure(function, repeat)
+            print(f"{name:40} size {size:>9}  {results[name]['time_min'] * 1000:10.2f} ms  "
+                  f"{results[name]['peak_bytes'] / 1e6:9.2f} MB", file=sys.stderr)
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """Cases of current that are slower, or use more memory, than the baseline by more than threshold."""
+
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+
+        metrics = ['peak_bytes']
+        if base['time_min'] >= MIN_COMPARED_TIME:
+            metrics.append('time_min')
+
+        for metric in metrics:
+            ratio = result[metric] / base[metric] if base[metric] else 1
+            if ratio > 1 + threshold:
+                regressions.append({'case': name, 'metric': metric, 'baseline': base[metric], 'current': result[metric], 'ratio': round(ratio, 3)})
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to compare the results against")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="relative slowdown reported as a regression")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="timed runs per case")
+    parser.add_argument('--engine', action='append', help="only run this engine, may be repeated")
+    parser.add_argument('--quick', action='store_true', help="only the two smallest values of every sweep")
+    args = parser.parse_args()
+
+    current = run(args.engine, args.repeat, args.quick)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = compare(baseline, current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} {regression['metric']}: "
+                  f"{regression['baseline']:.6g} -> {regression['current']:.6g} (x{regression['ratio']})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, responses fall back to gzip
+    brotli = None
+
+# Responses smaller than this (bytes) are sent uncompressed, the saving is not worth the CPU
+COMPRESS_MIN_SIZE = 1024
+
+# Compression levels, chosen for speed over ratio as responses are compressed per request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Content types sent as they are, already compressed
+UNCOMPRESSED_MIMETYPES = ('application/zip', 'application/gzip')
+
+
+def negotiate(accept_encodings):
+    """Content encoding for a request's Accept-Encoding: 'br', 'gzip' or None for identity."""
+
+    options = [encoding for encoding in ('br', 'gzip') if encoding != 'br' or brotli is not None]
+    quality = {encoding: accept_encodings[encoding] for encoding in options}
+    best = max(options, key=lambda encoding: quality[encoding])
+    return best if quality[best] > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def gzip_stream(chunks):
+    """Gzips a streamed body chunk by chunk, every chunk is flushed so the client receives it straight away."""
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compressible(response):
+    return (
+        200 <= response.status_code < 300
+        and response.status_code != 204
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype not in UNCOMPRESSED_MIMETYPES
+    )
@@ -1,189 +1,578 @@
-from itertools import groupby
+import heapq
+import math
 import numpy as np
-import math as mt
+from materials import resolve_inputs
+from section_checks import CHECKS, MATERIAL_DEFAULTS, LOAD_DEFAULTS, load_inputs, design_strengths, evaluate_sections
+from metrics import GRID_SIZE, stage
+
+# Number of sections returned by the search modes
+RESULT_LIMIT = 10
+
+# Upper bound on the top_k of a request, it bounds the heap of the ranked selection and the response
+MAX_TOP_K = 1000
+
+# Default search ranges (start, stop, step) in metres
+WIDTH_RANGE = (0.065, 0.1, 0.002)
+THICKNESS_RANGE = (0.055, 0.15, 0.002)
+
+# Final step of the adaptive mode in metres, when the request does not set a resolution
+ADAPTIVE_RESOLUTION = 0.0005
+
+# Finest step the adaptive mode can refine to in metres
+MIN_ADAPTIVE_RESOLUTION = 0.0001
+
+# Upper bound on the number of sections of a search grid held in memory at once
+MAX_GRID_POINTS = 1000000
+
+# Upper bound on the number of values of a search range or of a swept parameter, checked before allocating
+MAX_RANGE_POINTS = 1000000
+
+# Upper bound on the number of sections streamed through the ranked selection
+MAX_RANKED_GRID_POINTS = 100000000
+
+# Number of sections evaluated per chunk by the ranked selection
+RANKED_CHUNK_SIZE = 65536
+
+# Search modes, the metrics are labelled with them
+SEARCH_MODES = ('grid', 'frontier', 'pareto', 'adaptive')
+
+# Ranking keys of the ranked selection, lower rank is better
+RANKINGS = ('weight', 'utilisation', 'area', 'score')
+
+# Objectives the pareto mode can minimise, mapped to the evaluated values
+PARETO_OBJECTIVES = {
+    'weight': 'weight',
+    'final_utilisation': 'final',
+    'depth': 'thickness',
+}
+
+# Parameters a sweep can vary: material request keys and load symbols, mapped to (inputs, symbol)
+SWEEP_PARAMETERS = {key: ('material', symbol) for symbol, (key, _) in MATERIAL_DEFAULTS.items()}
+SWEEP_PARAMETERS |= {symbol: ('load', symbol) for symbol in LOAD_DEFAULTS}
+
+# Number of parameters a sweep can vary at once
+MAX_SWEEP_PARAMETERS = 2
+
+# Columns of the compact format: (field, unit, evaluated value, scale)
+COMPACT_FIELDS = (
+    ('weight', 'kg', 'weight', 1),
+    ('width', 'mm', 'width', 1000),
+    ('thickness', 'mm', 'thickness', 1000),
+    ('length', 'm', 'length', 1),
+    ('bending_utilisation', '%', 'bending', 1),
+    ('shear_utilisation', '%', 'shear', 1),
+    ('sls_utilisation', '%', 'sls', 1),
+    ('compression_utilisation', '%', 'compression', 1),
+    ('buckling_utilisation_in_plane', '%', 'buckling_y', 1),
+    ('buckling_utilisation_out_of_plane', '%', 'buckling_z', 1),
+    ('final_utilisation', '%', 'final', 1),
+)
+
+
+def pareto_front(objectives):
+    """Indices of the non-dominated points, all objectives minimised.
+
+    objectives is a list of equally long 1-d arrays. The points are sorted lexicographically,
+    so a point can only be dominated by one before it: with two objectives a single sweep
+    over the running minimum finds the front, with more objectives every point is only
+    compared against the front found so far.
+    """
+
+    order = np.lexsort(tuple(reversed(objectives)))
+    if len(objectives) == 2:
+        second = objectives[1][order]
+        running_min = np.minimum.accumulate(second)
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = second[1:] < running_min[:-1]
+        return order[keep]
+
+    points = np.stack([objective[order] for objective in objectives], axis=1)
+    front = []
+    for position, point in enumerate(points):
+        if front:
+            kept = points[front]
+            if np.any(np.all(kept <= point, axis=1) & np.any(kept < point, axis=1)):
+                continue
+        front.append(position)
+
+    return order[front]
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def range_size(start, stop, step):
+    """Number of values np.arange(start, stop, step) holds, known before allocating them."""
+
+    return math.ceil((stop - start) / step)
+
 
 class CrossSectionOptimizer:
-    def __init__(self, material, load, footprint):
+    def __init__(self, material, load, footprint, search=None, memo=None):
         self.material = material
         self.load = load
         self.footprint = footprint
+        self.search = search or {}
+
+        # Memo of the check results for incremental requests, see incremental.CheckMemo
+        self.memo = memo
+
+        self.width_range = self.search_range('widths', WIDTH_RANGE)
+        self.thickness_range = self.search_range('thicknesses', THICKNESS_RANGE)
+
+        self.widths = np.arange(*self.width_range)
+        self.thicknesses = np.arange(*self.thickness_range)
+
+        self.top_k = self.search.get('top_k', RESULT_LIMIT)
+        if not isinstance(self.top_k, int) or isinstance(self.top_k, bool) or not 1 <= self.top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k must be an integer between 1 and {MAX_TOP_K}")
+
+        self.rank_by = self.search.get('rank_by') or 'weight'
+        if self.rank_by not in RANKINGS:
+            raise ValueError(f"rank_by must be one of {', '.join(RANKINGS)}")
 
-        self.widths = np.arange(0.065, 0.1, 0.002)  # Stop at 0.252 to include 0.25
-        self.thicknesses = np.arange(0.055, 0.15, 0.002)  # Stop at 0.402 to include 0.4
-        
-    def optimizer(self):
-        
         #material_inputs
-        y_m = self.material.get('partial_factor') or 1.3  # Partial factor
-        rho = self.material.get('density') or  610  # Density
-        fm_k = self.material.get('bending_strength') or  91  # Bending strength
-        fv_k = self.material.get('shear_strength') or  9  # Shear strength
-        fc_k = self.material.get('compression_parallel') or  45  # Compression parallel strength
-        E = self.material.get('e_modulus') or  11.2  # E-modulus
-        E_0_G_05 = self.material.get('e_modulus_5') or  11.2  # E-modulus_5
-        kmod_p = self.material.get('modification_factor_permanent_term') or  0.5  # Modification factor permanent term
-        kmod_m = self.material.get('modification_factor_medium_term') or  0.65  # Modification factor medium term
-        kmod_i = self.material.get('modification_factor_instantaneous_term') or  0.9  # Modification factor instantaneous term
-        K_def = self.material.get('creep_factor') or  2  # Creep factor
-        B_c = self.material.get('creep_factor_solid_timber') or  0.2  # Factor for solid timber
-        
+        self.m = resolve_inputs(self.material)
+
         # Calculated by load calculator
-        P_L = self.load.get('P_L') or  2.96  
-        M_L = self.load.get('M_L') or  7.44
-        I_L = self.load.get('I_L') or  5.66
-        SLS_L = self.load.get('SLS_L') or  5.18
-        gk = self.load.get('gk') or  1.38
-        g_lead = self.load.get('g_lead') or  2
-        g_acmp = self.load.get('g_acmp') or  1.4
-        psi_lead = self.load.get('psi_lead') or  0
-        psi_acmp = self.load.get('psi_acmp') or  0.2
-        P_clm = self.load.get('P_clm') or  3.7
-        M_clm = self.load.get('M_clm') or  9.2
-        I_clm = self.load.get('I_clm') or  7
+        self.ld = load_inputs(self.load)
 
         # Footprint
-        L = self.footprint.get('beam_length') or  2  # BEAM_LENGTH
-        L_clm = self.footprint.get('height') or  2  # Column_LENGTH = height in footprint
- 
+        self.L = self.footprint.get('beam_length') or  2  # BEAM_LENGTH
+        self.L_clm = self.footprint.get('height') or  2  # Column_LENGTH = height in footprint
+
+    def search_range(self, key, default):
+        """(start, stop, step) of a search range in metres, the request may override each value."""
+
+        settings = self.search.get(key) or {}
+        if not isinstance(settings, dict):
+            raise ValueError(f"Invalid {key} range, expected {{start, stop, step}}")
+
+        start = settings.get('start') or default[0]
+        stop = settings.get('stop') or default[1]
+        step = settings.get('step') or default[2]
+
+        if not all(is_number(value) for value in (start, stop, step)) or step <= 0 or stop <= start:
+            raise ValueError(f"Invalid {key} range")
+        if range_size(start, stop, step) > MAX_RANGE_POINTS:
+            raise ValueError(f"The {key} range is limited to {MAX_RANGE_POINTS} values")
+
+        return start, stop, step
 
-        ###################start calculation#######################
+    def check_grid_size(self, limit=MAX_GRID_POINTS):
+        if len(self.widths) * len(self.thicknesses) > limit:
+            raise ValueError(f"Search grid is limited to {limit} sections")
+
+    def evaluate(self, widths, thicknesses):
+        """Evaluates every check over the widths x thicknesses grid, rows are widths."""
 
         # Derived design strength values
-        fm_d_p = (kmod_p * fm_k) / y_m
-        fm_d_m = (kmod_m * fm_k) / y_m
-        fm_d_i = (kmod_i * fm_k) / y_m
-        
-        fv_d_p = (kmod_p * fv_k) / y_m
-        fv_d_m = (kmod_m * fv_k) / y_m
-        fv_d_i = (kmod_i * fv_k) / y_m
-
-        fc_d_p = (kmod_p * fc_k) / y_m
-        fc_d_m = (kmod_m * fc_k) / y_m
-        fc_d_i = (kmod_i * fc_k) / y_m
-
-        # Prepare to collect results
+        fd = design_strengths(self.m)
+
+        return evaluate_sections(
+            np.asarray(widths)[:, None], np.asarray(thicknesses)[None, :], self.L, self.L_clm, self.m, self.ld, fd, self.memo
+        )
+
+    def optimizer(self):
+        results = self.sections()
+        with stage('formatting'):
+            return [self.format_result(result) for result in results]
+
+    def columns(self):
+        """The sections of optimizer() in the compact format: unrounded values, one column per field.
+
+        The status fields are left out, a check is acceptable when its utilisation is below 100%.
+        """
+
+        results = self.sections()
+        return {
+            'schema': {
+                'fields': [field for field, _, _, _ in COMPACT_FIELDS],
+                'units': [unit for _, unit, _, _ in COMPACT_FIELDS],
+            },
+            'columns': [[float(result[key]) * scale for result in results] for _, _, key, scale in COMPACT_FIELDS],
+            'rows': len(results),
+        }
+
+    def sections(self):
+        """Evaluated sections selected by the search mode, as returned by row()."""
+
+        mode = self.search.get('mode') or 'grid'
+        if not isinstance(mode, str) or mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}, expected one of {', '.join(SEARCH_MODES)}")
+
+        GRID_SIZE.observe(len(self.widths) * len(self.thicknesses), mode)
+        with stage('grid_evaluation'):
+            return self.search_sections(mode)
+
+    def search_sections(self, mode):
+        if mode == 'frontier':
+            return self.frontier_search()
+        if mode == 'pareto':
+            return self.pareto_search()
+        if mode == 'adaptive':
+            return self.adaptive_search()
+        if mode != 'grid':
+            raise ValueError(f"Unknown search mode: {mode}")
+        if 'top_k' in self.search or 'rank_by' in self.search:
+            return self.ranked_search()
+
+        self.check_grid_size()
+        grid = self.evaluate(self.widths, self.thicknesses)
+
+        # Walk the grid in width-major order, as the results are limited to the first
+        # acceptable section and the nine sections evaluated after it
+        acceptable = (grid['final'] < 100).ravel()
+        if not acceptable.any():
+            return []
+
+        first = int(np.argmax(acceptable))
+        selected = np.arange(first, min(first + 10, acceptable.size))
+        rows, cols = np.unravel_index(selected, grid['final'].shape)
+
+        results = [self.row(grid, (i, j), self.widths[i], self.thicknesses[j]) for i, j in zip(rows, cols)]
+
+        # Sort results by weight, sorted reverse just to show to user, because of limiting
+        results.sort(key=lambda result: (result['weight'], result['width'], result['thickness']), reverse=True)
+
+        return results
+
+    def sweep(self, parameters):
+        """Lightest acceptable section for every combination of the values of one or two parameters.
+
+        parameters maps a material key (bending_strength, density, ...) or a load symbol (P_L,
+        ...) to {start, stop, step} or {values}. The parameter x width x thickness space is
+        evaluated in one broadcast pass, the design strengths are derived once per parameter value.
+        """
+
+        if not isinstance(parameters, dict) or not parameters or len(parameters) > MAX_SWEEP_PARAMETERS:
+            raise ValueError(f"A sweep varies one to {MAX_SWEEP_PARAMETERS} parameters")
+
+        names = list(parameters)
+        axes = [self.sweep_values(name, parameters[name]) for name in names]
+        shape = tuple(len(values) for values in axes)
+
+        if int(np.prod(shape)) * len(self.widths) * len(self.thicknesses) > MAX_GRID_POINTS:
+            raise ValueError(f"Sweep is limited to {MAX_GRID_POINTS} sections")
+        GRID_SIZE.observe(int(np.prod(shape)) * len(self.widths) * len(self.thicknesses), 'sweep')
+
+        # Every swept value gets its own axis in front of the width and thickness axes
+        m = dict(self.m)
+        ld = dict(self.ld)
+        for axis, (name, values) in enumerate(zip(names, axes)):
+            inputs, symbol = SWEEP_PARAMETERS[name]
+            target = m if inputs == 'material' else ld
+            target[symbol] = values.reshape([len(values) if i == axis else 1 for i in range(len(axes) + 2)])
+
+        with stage('grid_evaluation'):
+            fd = design_strengths(m)
+            W = self.widths.reshape([1] * len(axes) + [-1, 1])
+            T = self.thicknesses.reshape([1] * len(axes) + [1, -1])
+            sections = evaluate_sections(W, T, self.L, self.L_clm, m, ld, fd, self.memo)
+
+            full_shape = shape + (len(self.widths), len(self.thicknesses))
+            sections = {key: np.broadcast_to(value, full_shape) for key, value in sections.items()}
+            weight = np.where(sections['final'] < 100, sections['weight'], np.inf).reshape(shape + (-1,))
+            lightest = np.argmin(weight, axis=-1)
+            feasible = np.isfinite(np.min(weight, axis=-1))
+
         results = []
-        iteration = 0
-        
-        # Iteration over possible dimensions
-        for W in self.widths:
-            if iteration >= 10:
+        for point in np.ndindex(*shape):
+            strengths = {key: float(np.broadcast_to(value, shape + (1, 1))[point][0, 0]) for key, value in fd.items()}
+            section = None
+            if feasible[point]:
+                i, j = np.unravel_index(lightest[point], (len(self.widths), len(self.thicknesses)))
+                section = self.format_result(self.row(sections, point + (i, j), self.widths[i], self.thicknesses[j]))
+
+            results.append({
+                'parameters': {name: round(float(values[index]), 10) for name, values, index in zip(names, axes, point)},
+                'design_strengths': {
+                    key: {'print_value': f"{key} = {value:.2f} MPa", 'value': round(value, 2)} for key, value in strengths.items()
+                },
+                'section': section,
+            })
+
+        return results
+
+    def sweep_values(self, name, settings):
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"Unknown sweep parameter: {name}")
+
+        settings = settings or {}
+        if not isinstance(settings, dict):
+            raise ValueError(f"Invalid {name} sweep, expected {{values}} or {{start, stop, step}}")
+
+        if 'values' in settings:
+            values = settings['values']
+            if not isinstance(values, list) or not all(is_number(value) for value in values):
+                raise ValueError(f"Invalid {name} sweep, values must be a list of numbers")
+            if len(values) > MAX_RANGE_POINTS:
+                raise ValueError(f"A sweep is limited to {MAX_RANGE_POINTS} values per parameter")
+            values = np.asarray(values, dtype=float)
+        else:
+            start, stop, step = settings.get('start'), settings.get('stop'), settings.get('step')
+            if not all(is_number(value) for value in (start, stop, step)) or step <= 0 or stop <= start:
+                raise ValueError(f"Invalid {name} sweep, expected values or start < stop and step > 0")
+            if range_size(start, stop, step) > MAX_RANGE_POINTS:
+                raise ValueError(f"A sweep is limited to {MAX_RANGE_POINTS} values per parameter")
+            values = np.arange(start, stop, step, dtype=float)
+
+        if values.size == 0:
+            raise ValueError(f"Empty {name} sweep")
+        return values
+
+    def frontier(self, widths, thicknesses):
+        """Index of the smallest feasible thickness for every width, len(thicknesses) if none is.
+
+        Every utilisation falls as the thickness grows, so each width is bisected over the
+        thicknesses instead of scanned; all widths are bisected together.
+        """
+
+        fd = design_strengths(self.m)
+
+        lo = np.zeros(len(widths), dtype=int)
+        hi = np.full(len(widths), len(thicknesses))
+        while True:
+            active = np.flatnonzero(lo < hi)
+            if active.size == 0:
+                return lo
+
+            mid = (lo[active] + hi[active]) // 2
+            feasible = evaluate_sections(widths[active], thicknesses[mid], self.L, self.L_clm, self.m, self.ld, fd, self.memo)['final'] < 100
+            hi[active] = np.where(feasible, mid, hi[active])
+            lo[active] = np.where(feasible, lo[active], mid + 1)
+
+    def frontier_search(self):
+        """Best ranked sections among the smallest feasible thickness of every width."""
+
+        index = self.frontier(self.widths, self.thicknesses)
+        has_feasible = index < len(self.thicknesses)
+
+        widths = self.widths[has_feasible]
+        thicknesses = self.thicknesses[index[has_feasible]]
+        sections = evaluate_sections(widths, thicknesses, self.L, self.L_clm, self.m, self.ld, memo=self.memo)
+
+        heap = []
+        self.push_candidates(heap, widths, thicknesses, sections)
+        return self.ranked_results(heap)
+
+    def pareto_search(self):
+        """Pareto-optimal acceptable sections of the whole grid, lightest first."""
+
+        objectives = self.search.get('objectives') or ['weight', 'final_utilisation']
+        unknown = [objective for objective in objectives if objective not in PARETO_OBJECTIVES]
+        if unknown or len(objectives) < 2:
+            raise ValueError(f"Pareto objectives must be at least two of {', '.join(PARETO_OBJECTIVES)}")
+
+        self.check_grid_size()
+        grid = self.evaluate(self.widths, self.thicknesses)
+        rows, cols = np.nonzero(grid['final'] < 100)
+
+        values = {key: grid[key][rows, cols] for key in ('weight', 'final')}
+        values['thickness'] = self.thicknesses[cols]
+        front = pareto_front([values[PARETO_OBJECTIVES[objective]] for objective in objectives])
+
+        results = [self.row(grid, (rows[i], cols[i]), self.widths[rows[i]], self.thicknesses[cols[i]]) for i in front]
+        results.sort(key=lambda result: (result['weight'], result['width'], result['thickness']))
+
+        return results
+
+    def adaptive_search(self):
+        """Best ranked acceptable sections found by coarse-to-fine refinement.
+
+        The width and thickness ranges are scanned with their own (coarse) steps first. Every
+        cell whose corners are not all acceptable or all unacceptable straddles the 100%
+        utilisation boundary and is split into four, until the step reaches the resolution.
+        The sections evaluated over all levels are limited to MAX_GRID_POINTS.
+        """
+
+        resolution = self.search.get('resolution')
+        if resolution is None:
+            resolution = ADAPTIVE_RESOLUTION
+        if not is_number(resolution) or resolution < MIN_ADAPTIVE_RESOLUTION:
+            raise ValueError(f"resolution must be a number of at least {MIN_ADAPTIVE_RESOLUTION} m")
+
+        W_start, _, W_step = self.width_range
+        T_start, _, T_step = self.thickness_range
+        levels = max(int(np.ceil(np.log2(max(W_step, T_step) / resolution))), 0)
+
+        self.check_grid_size()
+
+        fd = design_strengths(self.m)
+
+        # Cells and their corners are kept as integer lattice coordinates of the current level
+        i, j = np.meshgrid(np.arange(len(self.widths)), np.arange(len(self.thicknesses)), indexing='ij')
+        corners = np.stack([i.ravel(), j.ravel()], axis=1)
+        scale = 1
+
+        evaluated = []
+        evaluated_count = 0
+        for level in range(levels + 1):
+            evaluated_count += len(corners)
+            if evaluated_count > MAX_GRID_POINTS:
+                raise ValueError(f"Adaptive refinement is limited to {MAX_GRID_POINTS} sections, use a coarser resolution")
+
+            W = W_start + corners[:, 0] * (W_step / scale)
+            T = T_start + corners[:, 1] * (T_step / scale)
+            values = evaluate_sections(W, T, self.L, self.L_clm, self.m, self.ld, fd, self.memo)
+            evaluated.append((W, T, values))
+            if level == levels:
+                break
+
+            if level == 0:
+                feasible = (values['final'] < 100).reshape(len(self.widths), len(self.thicknesses))
+                corner_sum = feasible[:-1, :-1].astype(int) + feasible[1:, :-1] + feasible[:-1, 1:] + feasible[1:, 1:]
+                cells = np.argwhere((corner_sum > 0) & (corner_sum < 4))
+            else:
+                feasible = values['final'][inverse].reshape(-1, 4) < 100
+                cells = cells[feasible.any(axis=1) & ~feasible.all(axis=1)]
+
+            if len(cells) == 0:
                 break
-                
-            for T in self.thicknesses:    
-                V = L * W * T
-                Wt = rho * V
-                I_y = (W * 1000) * ((T * 1000)**3) / 12  # Moment of inertia with correct units
-                I_z = (T * 1000) * ((W * 1000)**3) / 12  # Moment of inertia with correct units
-
-                # ULS Calculations for beam
-                Md_1 = P_L * L**2 / 8
-                Md_2 = M_L * L**2 / 8
-                Md_3 = I_L * L**2 / 8
-
-                h = T  # Total depth of the beam
-
-                # Shear and Bending stresses for ULS beam
-                tau_1 = 3/2 * (P_L * L / 2) / (W * h) / 1000
-                tau_2 = 3/2 * (M_L * L / 2) / (W * h) / 1000
-                tau_3 = 3/2 * (I_L * L / 2) / (W * h) / 1000
-
-                util_bend = max((Md_1 / I_y) * (h * 1000 / 2) * (10**6) / fm_d_p,
-                                (Md_2 / I_y) * (h * 1000 / 2) * (10**6) / fm_d_m,
-                                (Md_3 / I_y) * (h * 1000 / 2) * (10**6) / fm_d_i) * 100
-                util_shear = max(tau_1 / fv_d_p, tau_2 / fv_d_m, tau_3 / fv_d_i) * 100
-
-                # SLS Calculations for deflection
-                δ_inst = 5*(1e6) *(SLS_L * L**4) / (384 * E * I_y)
-                δ_crp_g = 5*(1e6) *(gk * L**4) * K_def / (384 * E * I_y)
-                δ_crp_lead = 5*(1e6) *(g_lead * L**4) * K_def * psi_lead / (384 * E * I_y)
-                δ_crp_acmp = 5*(1e6) *(g_acmp * L**4) * K_def * psi_acmp / (384 * E * I_y)
-                δ_fin = δ_inst + δ_crp_g + δ_crp_lead + δ_crp_acmp
-
-                util_deflct_inst = δ_inst / (L / 300) * 100
-                util_deflct_fin = δ_fin / (L / 150) * 100
-                util_sls = max(util_deflct_inst, util_deflct_fin)
-
-
-                # ULS Calculations for Column Compression
-                Strs_c_1 = P_clm / ((W * T)*(1e3))
-                Strs_c_2 = M_clm / ((W * T)*(1e3))
-                Strs_c_3 = I_clm / ((W * T)*(1e3))
-
-                util_cmprs = max(Strs_c_1 / fc_d_p , Strs_c_2 / fc_d_m , Strs_c_3/ fc_d_i ) * 100
-
-
-                # ULS Calculations for Column Buckling
-                L_y = L_clm     # Buckling lengths
-                L_Z = L_clm 
-                
-                i_y = (I_y / (W * T* (1e12)))**(1/2) #Radius of inertia
-                i_z = (I_z / (W * T* (1e12)))**(1/2)
-                
-                sln_rtio_y = L_y/i_y        #Slenderness ratio
-                sln_rtio_z = L_Z/i_z 
-                
-                sln_rel_y = (((sln_rtio_y/ mt.pi)) * (((fc_k/ E_0_G_05 )*(10))**(1/2)))/100   #Relative slenderness ratio
-                sln_rel_z = (((sln_rtio_z/ mt.pi)) * (((fc_k/ E_0_G_05 )*(10))**(1/2)))/100  
-
-                k_y = 0.5 * (1 + B_c * (sln_rel_y - 0.3) + (sln_rel_y **2))   #Instability factor 
-                k_z = 0.5 * (1 + B_c * (sln_rel_z - 0.3) + (sln_rel_z **2))
-
-                k_c_y = 1 / (k_y + mt.sqrt((k_y**2) - (sln_rel_y **2)))      #Buckling reduction coefficient 
-                k_c_z = 1 / (k_z + mt.sqrt((k_z**2) - (sln_rel_z **2)))
-
-                util_buckl_y = (Strs_c_1/ ((k_c_y) * (fc_d_m))) * 100   #Utilization in plane
-                util_buckl_z = (Strs_c_1/ ((k_c_z) * (fc_d_m) )) * 100  #Utilization out of plane
-
-
-                # Acceptability checks
-                bend_status = "Acceptable" if util_bend < 100 else "Unacceptable"
-                shear_status = "Acceptable" if util_shear < 100 else "Unacceptable"
-                sls_status = "Acceptable" if util_sls < 100 else "Unacceptable"
-                Compression_status = "Acceptable" if util_cmprs < 100 else "Unacceptable"
-                bkl_y_status = "Acceptable" if util_buckl_y < 100 else "Unacceptable"
-                bkl_z_status = "Acceptable" if util_buckl_z < 100 else "Unacceptable"
-                util_final = max(util_bend,util_shear, util_sls, util_cmprs, util_buckl_y, util_buckl_z)
-                final_status = "Acceptable" if util_final < 100 else "Unacceptable"
-                
-                #added for limiting the results
-                if (iteration == 0 and final_status == "Acceptable") or (iteration > 0 and iteration < 10):
-                    results.append((Wt, W, T, L, util_bend, bend_status, util_shear, shear_status, util_sls, sls_status, util_cmprs, Compression_status, util_buckl_y, bkl_y_status, util_buckl_z, bkl_z_status, util_final, final_status ))
-                    iteration += 1
-                    
-                if iteration >= 10:
-                    break
-
-        # Sort results by weight and print final summary
-        results.sort(reverse=True)  # Default sort by first element which is weight #sorted reverse just to show to user, because of limiting
-        
-        output = []
-
-        for result in results:
-            result_dict = {
-                "weight": {'print_value': f"{result[0]:.2f} kg", 'value': round(result[0], 2)},
-                "width": {'print_value': f"{result[1]*1000:.0f} mm", 'value': round(result[1]*1000, 2)},
-                "thickness": {'print_value': f"{result[2]*1000:.0f} mm", 'value': round(result[2]*1000, 2)},
-                "length": {'print_value': f"{result[3]:.2f} m", 'value': round(result[3], 2)},
-                "bending_utilisation": {'print_value': f"{result[4]:.2f}%", 'value': round(result[4], 2)},
-                "bending_status": {'print_value': result[5], 'value': result[5] == 'Acceptable'},
-                "shear_utilisation": {'print_value': f"{result[6]:.2f}%", 'value': round(result[6], 2)},
-                "shear_status": {'print_value': result[7], 'value': result[7] == 'Acceptable'},
-                "sls_utilisation": {'print_value': f"{result[8]:.2f}%", 'value': round(result[8], 2)},
-                "sls_status": {'print_value': result[9], 'value': result[9] == 'Acceptable'},
-                "compression_utilisation": {'print_value': f"{result[10]:.2f}%", 'value': round(result[10], 2)},
-                "compression_status": {'print_value': result[11], 'value': result[11] == 'Acceptable'},
-                "buckling_utilisation_in_plane": {'print_value': f"{result[12]:.2f}%", 'value': round(result[12], 2)},
-                "buckling_status_in_plane": {'print_value': result[13], 'value': result[13] == 'Acceptable'},
-                "buckling_utilisation_out_of_plane": {'print_value': f"{result[14]:.2f}%", 'value': round(result[14], 2)},
-                "buckling_status_out_of_plane": {'print_value': result[15], 'value': result[15] == 'Acceptable'},
-                "final_utilisation": {'print_value': f"{result[16]:.2f}%", 'value': round(result[16], 2)},
-                "final_utilisation_status": {'print_value': result[17], 'value': result[17] == 'Acceptable'},
-            }
-            
-            output.append(result_dict)
-
-        return output
+            # Every straddling cell adds at least one corner to the next level
+            if evaluated_count + len(cells) > MAX_GRID_POINTS:
+                raise ValueError(f"Adaptive refinement is limited to {MAX_GRID_POINTS} sections, use a coarser resolution")
+
+            # Split every straddling cell into four and collect the distinct corners of the children
+            scale *= 2
+            cells = (2 * cells[:, None, :] + np.array([[0, 0], [1, 0], [0, 1], [1, 1]])).reshape(-1, 2)
+            child_corners = (cells[:, None, :] + np.array([[0, 0], [1, 0], [0, 1], [1, 1]])).reshape(-1, 2)
+            corners, inverse = np.unique(child_corners, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+
+        W = np.concatenate([item[0] for item in evaluated])
+        T = np.concatenate([item[1] for item in evaluated])
+        sections = {key: np.concatenate([item[2][key] for item in evaluated]) for key in evaluated[0][2]}
+
+        # Corners shared by several levels are ranked once
+        _, first = np.unique(np.round(np.stack([W, T], axis=1), 9), axis=0, return_index=True)
+
+        heap = []
+        self.push_candidates(heap, W[first], T[first], {key: value[first] for key, value in sections.items()})
+        return self.ranked_results(heap)
+
+    def ranked_search(self):
+        """Best ranked acceptable sections of the whole grid.
+
+        The grid is evaluated in tiles of widths x thicknesses of at most RANKED_CHUNK_SIZE
+        sections and streamed through a heap bounded to top_k entries, so memory does not grow
+        with the grid, even when one axis alone is longer than a tile.
+        """
+
+        self.check_grid_size(MAX_RANKED_GRID_POINTS)
+        fd = design_strengths(self.m)
+
+        heap = []
+        thickness_chunk = min(len(self.thicknesses), RANKED_CHUNK_SIZE)
+        width_chunk = max(RANKED_CHUNK_SIZE // thickness_chunk, 1)
+        for width_start in range(0, len(self.widths), width_chunk):
+            W = self.widths[width_start:width_start + width_chunk, None]
+            for thickness_start in range(0, len(self.thicknesses), thickness_chunk):
+                T = self.thicknesses[None, thickness_start:thickness_start + thickness_chunk]
+                values = evaluate_sections(W, T, self.L, self.L_clm, self.m, self.ld, fd, self.memo)
+                self.push_candidates(heap, W, T, values)
+
+        return self.ranked_results(heap)
+
+    def rank(self, W, T, values):
+        """Ranking key of evaluated sections, lower is better.
+
+        weight and area rank the lightest and smallest sections first, utilisation ranks the
+        most utilised first. score is a weighted sum of the weight (kg), the spare capacity
+        (100 - final utilisation, %) and the area (cm2), weighted by search.score_weights.
+        """
+
+        if self.rank_by == 'weight':
+            return values['weight']
+        if self.rank_by == 'utilisation':
+            return -values['final']
+        if self.rank_by == 'area':
+            return W * T
+
+        weights = self.search.get('score_weights') or {}
+        return (weights.get('weight', 1) * values['weight']
+                + weights.get('utilisation', 0) * (100 - values['final'])
+                + weights.get('area', 0) * (W * T * 1e4))
+
+    def push_candidates(self, heap, W, T, values):
+        """Pushes the acceptable sections of one batch into a heap holding the best top_k.
+
+        The heap stores (-rank, -W, -T) so its root is the worst section kept. Only the best
+        top_k of the batch are considered, picked with a partial sort.
+        """
+
+        W, T = np.broadcast_arrays(W, T)
+        rank = np.broadcast_to(self.rank(W, T, values), W.shape).ravel()
+        W = W.ravel()
+        T = T.ravel()
+        final = values['final'].ravel()
+
+        acceptable = np.flatnonzero(final < 100)
+        if acceptable.size > self.top_k:
+            acceptable = acceptable[np.argpartition(rank[acceptable], self.top_k - 1)[:self.top_k]]
+
+        for index in acceptable:
+            entry = (-float(rank[index]), -float(W[index]), -float(T[index]))
+            if len(heap) < self.top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def ranked_results(self, heap):
+        """Evaluates the sections kept in the heap, best first."""
+
+        entries = sorted(heap, reverse=True)
+        W = np.array([-entry[1] for entry in entries])
+        T = np.array([-entry[2] for entry in entries])
+        sections = evaluate_sections(W, T, self.L, self.L_clm, self.m, self.ld, memo=self.memo)
+
+        return [self.row(sections, i, W[i], T[i]) for i in range(len(entries))]
+
+    def row(self, values, index, W, T):
+        """Collects the raw values of one evaluated section."""
+
+        result = {
+            'weight': values['weight'][index],
+            'width': W,
+            'thickness': T,
+            'length': self.L,
+            'final': values['final'][index],
+        }
+        for check in CHECKS:
+            result[check] = values[check][index]
+
+        return result
+
+    def format_result(self, result):
+        bend_status = "Acceptable" if result['bending'] < 100 else "Unacceptable"
+        shear_status = "Acceptable" if result['shear'] < 100 else "Unacceptable"
+        sls_status = "Acceptable" if result['sls'] < 100 else "Unacceptable"
+        Compression_status = "Acceptable" if result['compression'] < 100 else "Unacceptable"
+        bkl_y_status = "Acceptable" if result['buckling_y'] < 100 else "Unacceptable"
+        bkl_z_status = "Acceptable" if result['buckling_z'] < 100 else "Unacceptable"
+        final_status = "Acceptable" if result['final'] < 100 else "Unacceptable"
+
+        return {
+            "weight": {'print_value': f"{result['weight']:.2f} kg", 'value': round(result['weight'], 2)},
+            "width": {'print_value': f"{result['width']*1000:.0f} mm", 'value': round(result['width']*1000, 2)},
+            "thickness": {'print_value': f"{result['thickness']*1000:.0f} mm", 'value': round(result['thickness']*1000, 2)},
+            "length": {'print_value': f"{result['length']:.2f} m", 'value': round(result['length'], 2)},
+            "bending_utilisation": {'print_value': f"{result['bending']:.2f}%", 'value': round(result['bending'], 2)},
+            "bending_status": {'print_value': bend_status, 'value': bend_status == 'Acceptable'},
+            "shear_utilisation": {'print_value': f"{result['shear']:.2f}%", 'value': round(result['shear'], 2)},
+            "shear_status": {'print_value': shear_status, 'value': shear_status == 'Acceptable'},
+            "sls_utilisation": {'print_value': f"{result['sls']:.2f}%", 'value': round(result['sls'], 2)},
+            "sls_status": {'print_value': sls_status, 'value': sls_status == 'Acceptable'},
+            "compression_utilisation": {'print_value': f"{result['compression']:.2f}%", 'value': round(result['compression'], 2)},
+            "compression_status": {'print_value': Compression_status, 'value': Compression_status == 'Acceptable'},
+            "buckling_utilisation_in_plane": {'print_value': f"{result['buckling_y']:.2f}%", 'value': round(result['buckling_y'], 2)},
+            "buckling_status_in_plane": {'print_value': bkl_y_status, 'value': bkl_y_status == 'Acceptable'},
+            "buckling_utilisation_out_of_plane": {'print_value': f"{result['buckling_z']:.2f}%", 'value': round(result['buckling_z'], 2)},
+            "buckling_status_out_of_plane": {'print_value': bkl_z_status, 'value': bkl_z_status == 'Acceptable'},
+            "final_utilisation": {'print_value': f"{result['final']:.2f}%", 'value': round(result['final'], 2)},
+            "final_utilisation_status": {'print_value': final_status, 'value': final_status == 'Acceptable'},
+        }
 
 
 #Width beam= width
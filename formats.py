@@ -0,0 +1,117 @@
+import io
+import json
+import re
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for format=msgpack
+    msgpack = None
+
+# Response formats of the calculation endpoints, verbose is the {print_value, value} format of the UI
+FORMATS = ('verbose', 'compact', 'msgpack', 'npz')
+
+# Content types of the binary encodings of the compact format
+MIMETYPES = {
+    'msgpack': 'application/msgpack',
+    'npz': 'application/octet-stream',
+}
+
+# Unit at the end of a print_value, after the number: "11.82 kg", "33.99%", "2.74 kN/m"
+UNIT_PATTERN = re.compile(r'-?\d+(?:\.\d+)?\s*([^\d\s]*)$')
+
+
+class FormatUnavailable(Exception):
+    pass
+
+
+def response_format(data):
+    """Format requested by a request body, checked before anything is calculated."""
+
+    name = data.get('format') or 'verbose'
+    if name not in FORMATS:
+        raise ValueError(f"Unknown format: {name}, expected one of {', '.join(FORMATS)}")
+    if name == 'msgpack' and msgpack is None:
+        raise FormatUnavailable("The msgpack format needs the msgpack package on the server")
+    return name
+
+
+def is_compact(data):
+    return response_format(data) != 'verbose'
+
+
+def is_verbose(value):
+    return isinstance(value, dict) and value.keys() == {'print_value', 'value'}
+
+
+def plain(value):
+    """value with every nested {print_value, value} pair replaced by its value."""
+
+    if is_verbose(value):
+        return value['value']
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+def unit(print_value):
+    match = UNIT_PATTERN.search(str(print_value))
+    return match.group(1) if match else None
+
+
+def compact(results):
+    """Converts a verbose result, one record or a list of records, to the compact format.
+
+    Fields are taken from the first record and units from its print values (None for
+    statuses). Fields of a single record that are not {print_value, value} pairs, such as
+    the wind pressures per area of load_calculator, are kept next to the columns with their
+    nested pairs reduced to the values.
+    """
+
+    records = results if isinstance(results, list) else [results]
+    first = records[0] if records else {}
+    fields = [field for field, value in first.items() if is_verbose(value)]
+
+    table = {
+        'schema': {
+            'fields': fields,
+            'units': [unit(first[field]['print_value']) for field in fields],
+        },
+        'columns': [[record[field]['value'] for record in records] for field in fields],
+        'rows': len(records),
+    }
+    if not isinstance(results, list):
+        table |= {field: plain(value) for field, value in results.items() if not is_verbose(value)}
+    return table
+
+
+def encode(table, name):
+    """Binary encoding of a compact table: (body, mimetype)."""
+
+    if name == 'msgpack':
+        return msgpack.packb(table), MIMETYPES[name]
+
+    if name == 'npz':
+        # One array per field, next to the schema; nested lists of values become their own arrays
+        arrays = {
+            '_fields': np.array(table['schema']['fields'], dtype=str),
+            '_units': np.array([symbol or '' for symbol in table['schema']['units']], dtype=str),
+        }
+        arrays |= {field: np.asarray(column) for field, column in zip(table['schema']['fields'], table['columns'])}
+        for key, value in table.items():
+            if isinstance(value, dict) and key != 'schema':
+                arrays |= {f"{key}.{field}": np.asarray(column) for field, column in value.items()}
+
+        # Object arrays would be pickled, which clients cannot load safely
+        for key, array in arrays.items():
+            if array.dtype == object:
+                raise TypeError(f"{key} is not a numeric or string array")
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue(), MIMETYPES[name]
+
+    return json.dumps(table).encode(), 'application/json'
@@ -0,0 +1,124 @@
+import json
+import zipfile
+
+import tasks
+from process_pool import pool_map, worker_count
+
+# Options of /generate_g_code applied to every joint of a batch, unless the joint sets its own
+SHARED_OPTIONS = ('step_down', 'optimized', 'stepover')
+
+# Name of the file describing the archive contents
+MANIFEST_NAME = 'manifest.json'
+
+
+def shelter_cut_list(footprint, cross_section):
+    """Mortise and tenon joints of a shelter: every column meets a tie beam at the top and the sill at the bottom."""
+
+    columns = footprint.get('column_number') or 6
+    tie_beam = {
+        key: cross_section[key] for key in ('tie_beam_w', 'tie_beam_h', 'column_h') if cross_section.get(key)
+    }
+    sill = tie_beam | {
+        target: cross_section[key]
+        for key, target in (('bottom_sill_w', 'tie_beam_w'), ('bottom_sill_h', 'tie_beam_h'))
+        if cross_section.get(key)
+    }
+
+    return [
+        {'name': 'column_tie_beam', 'quantity': columns} | tie_beam,
+        {'name': 'column_sill', 'quantity': columns} | sill,
+    ]
+
+
+def cut_list(data):
+    """Joints of a batch request: its cut_list, or the shelter joints derived from footprint and cross_section."""
+
+    joints = data.get('cut_list')
+    if joints is None:
+        joints = shelter_cut_list(data.get('footprint', {}), data.get('cross_section', {}))
+
+    if not isinstance(joints, list) or not all(isinstance(joint, dict) for joint in joints):
+        raise ValueError("cut_list must be a list of joints")
+
+    shared = {key: data[key] for key in SHARED_OPTIONS if key in data}
+    joints = [shared | joint for joint in joints]
+
+    for joint in joints:
+        quantity = joint.get('quantity', 1)
+        if not isinstance(quantity, int) or quantity < 1:
+            raise ValueError(f"Joint quantity must be a positive integer, got {quantity!r}")
+
+    return joints
+
+
+def plan_batch(data):
+    """Deduplicates the joints of a batch: (manifest, programs), one program per unique set of parameters.
+
+    The manifest maps every joint to the file of its program, programs[i] is the request
+    body that generates the file program_<i + 1>.nc.
+    """
+
+    # Checked up front, the archive is streamed once the programs are planned
+    worker_count(data.get('workers'))
+
+    programs = []
+    files = {}
+    manifest = {'joints': [], 'programs': []}
+
+    for index, joint in enumerate(cut_list(data)):
+        parameters = tasks.gcode_parameters(joint)
+        key = tuple(sorted(parameters.items()))
+
+        if key not in files:
+            files[key] = f"program_{len(programs) + 1}.nc"
+            programs.append(joint)
+            manifest['programs'].append({'file': files[key], 'parameters': parameters})
+
+        manifest['joints'].append({
+            'name': joint.get('name') or f"joint_{index + 1}",
+            'quantity': joint.get('quantity', 1),
+            'file': files[key],
+        })
+
+    manifest['joint_count'] = sum(joint['quantity'] for joint in manifest['joints'])
+    manifest['program_count'] = len(programs)
+    return manifest, programs
+
+
+class _ArchiveStream:
+    """Write-only file object for zipfile, the written bytes are taken out as the archive grows."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_batch_zip(manifest, programs, workers=None):
+    """Yields a zip archive with the manifest and every program, generated in parallel.
+
+    Programs are added in order as the worker processes return them, so only the
+    programs not yet written are held in memory.
+    """
+
+    stream = _ArchiveStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+        yield stream.drain()
+
+        results = pool_map(tasks.gcode_program, programs, workers)
+        for program, gcode in zip(manifest['programs'], results):
+            archive.writestr(program['file'], gcode)
+            yield stream.drain()
+
+    yield stream.drain()
@@ -1,3 +1,29 @@
+import math
+
+# Number of G-code lines sent per chunk when streaming a program
+STREAM_CHUNK_LINES = 256
+
+# Smallest depth of cut per pass (mm), it bounds the number of passes of a program
+MIN_STEP_DOWN = 0.1
+
+# Optimised toolpath: share of the tool diameter between zig-zag rows
+STEPOVER_RATIO = 0.5
+
+# Optimised toolpath: smallest share of the tool diameter between zig-zag rows a request may ask for
+MIN_STEPOVER_RATIO = 0.05
+
+# Optimised toolpath: maximum length of the ramp used to enter each layer (mm)
+RAMP_LENGTH = 20
+
+# Optimised toolpath: height above the surface where rapid moves stop (mm)
+CLEARANCE = 2
+
+# Holes deeper than this many diameters are drilled with pecking (G83)
+PECK_DEPTH_RATIO = 3
+
+# Rapid traverse rate (mm/min) assumed by the cycle time estimate
+RAPID_RATE = 5000
+
 class GCodeGanarator:
     def generate_gcode(
         self,
@@ -14,27 +40,88 @@ class GCodeGanarator:
         spindle_speed,
         safe_z,
         step_down=2,  # Added step-down parameter
+        optimized=False,
+        stepover=None,
     ):
-        """Generates G-code for a Lock n Load joint (a variation of pegged mortise and tenon)."""
+        """Generates G-code for a Lock n Load joint (a variation of pegged mortise and tenon).
 
-        gcode = ""
+        With optimized=True the pockets are cleared by zig-zag passes entered on a ramp, the
+        peg holes use drilling cycles and the moves are ordered to reduce air travel.
+        """
+
+        return "".join(self.iter_gcode(
+            mortise_width,
+            mortise_height,
+            mortise_depth,
+            tenon_width,
+            tenon_height,
+            tenon_length,
+            peg_diameter,
+            peg_depth,
+            tool_diameter,
+            feed_rate,
+            spindle_speed,
+            safe_z,
+            step_down,
+            optimized,
+            stepover,
+        ))
+
+    def iter_gcode(
+        self,
+        mortise_width,
+        mortise_height,
+        mortise_depth,
+        tenon_width,
+        tenon_height,
+        tenon_length,
+        peg_diameter,
+        peg_depth,
+        tool_diameter,
+        feed_rate,
+        spindle_speed,
+        safe_z,
+        step_down=2,
+        optimized=False,
+        stepover=None,
+    ):
+        """Yields the lines of generate_gcode one by one, so the program is never held in memory."""
+
+        if optimized:
+            yield from self.iter_optimized_gcode(
+                mortise_width,
+                mortise_height,
+                mortise_depth,
+                tenon_width,
+                tenon_height,
+                tenon_length,
+                peg_diameter,
+                peg_depth,
+                tool_diameter,
+                feed_rate,
+                spindle_speed,
+                safe_z,
+                step_down,
+                stepover or STEPOVER_RATIO * tool_diameter,
+            )
+            return
 
         # Setup
-        gcode += "G21\n"  # Set units to millimeters
-        gcode += "G17\n"  # Set XY plane
-        gcode += "G90\n"  # Set to absolute coordinates
-        gcode += f"F{feed_rate}\n"
-        gcode += f"S{spindle_speed}\n"
+        yield "G21\n"  # Set units to millimeters
+        yield "G17\n"  # Set XY plane
+        yield "G90\n"  # Set to absolute coordinates
+        yield f"F{feed_rate}\n"
+        yield f"S{spindle_speed}\n"
 
         # Mortise
         # Assumption: Mortise starts at X0 Y0
-        gcode += self.mill_pocket(
+        yield from self.iter_mill_pocket(
             0, 0, -mortise_depth, mortise_width, mortise_height, tool_diameter, safe_z, step_down
         )
 
         # Tenon
         # Assumption: Tenon starts at X0 Y0
-        gcode += self.mill_pocket(
+        yield from self.iter_mill_pocket(
             0,
             0,
             -tenon_length,
@@ -47,37 +134,265 @@ class GCodeGanarator:
 
         # Peg holes (through mortise and tenon)
         # Assumption: Pegs are centered on the mortise/tenon
-        gcode += self.drill_hole(mortise_width / 2, mortise_height / 2, -peg_depth, peg_diameter, safe_z)
-        gcode += self.drill_hole(mortise_width / 2, tenon_height / 2, -peg_depth, peg_diameter, safe_z)
+        yield from self.iter_drill_hole(mortise_width / 2, mortise_height / 2, -peg_depth, peg_diameter, safe_z)
+        yield from self.iter_drill_hole(mortise_width / 2, tenon_height / 2, -peg_depth, peg_diameter, safe_z)
+
+        # End of program
+        yield "M30\n"
+
+    def iter_optimized_gcode(
+        self,
+        mortise_width,
+        mortise_height,
+        mortise_depth,
+        tenon_width,
+        tenon_height,
+        tenon_length,
+        peg_diameter,
+        peg_depth,
+        tool_diameter,
+        feed_rate,
+        spindle_speed,
+        safe_z,
+        step_down,
+        stepover,
+    ):
+        # Setup
+        yield "G21\n"  # Set units to millimeters
+        yield "G17\n"  # Set XY plane
+        yield "G90\n"  # Set to absolute coordinates
+        yield f"F{feed_rate}\n"
+        yield f"S{spindle_speed}\n"
+        yield f"G0 Z{safe_z}\n"
+
+        # Same features as the default program, both pockets start at X0 Y0
+        pockets = [
+            (0, 0, -mortise_depth, mortise_width, mortise_height),
+            (0, 0, -tenon_length, tenon_width, tenon_height),
+        ]
+        holes = [
+            (mortise_width / 2, mortise_height / 2, -peg_depth),
+            (mortise_width / 2, tenon_height / 2, -peg_depth),
+        ]
+
+        # Pockets first, then holes, each visited nearest first from where the tool is. A pocket
+        # inside another is cut after it and only below its floor, if at all
+        position = (0, 0)
+        cleared = []
+        for level in sorted({nesting(pocket, pockets) for pocket in pockets}):
+            nested = [pocket for pocket in pockets if nesting(pocket, pockets) == level]
+            for pocket in order_nearest(nested, position, lambda pocket: pocket_entry(*pocket, tool_diameter)):
+                z_top = min([0] + [other[2] for other in cleared if contains(other, pocket)])
+                if z_top > pocket[2]:
+                    yield from self.iter_clear_pocket(*pocket, tool_diameter, safe_z, step_down, stepover, z_top)
+                    position = pocket_entry(*pocket, tool_diameter)
+                cleared.append(pocket)
+
+        # A hole shared by both parts is drilled once, to the deepest depth
+        deepest = {}
+        for x_pos, y_pos, z_depth in holes:
+            deepest[(x_pos, y_pos)] = min(z_depth, deepest.get((x_pos, y_pos), z_depth))
+        holes = [(x_pos, y_pos, z_depth) for (x_pos, y_pos), z_depth in deepest.items()]
+
+        yield from self.iter_drill_cycle(order_nearest(holes, position, lambda hole: hole[:2]), peg_diameter, safe_z)
 
         # End of program
-        gcode += "M30\n"
+        yield "M30\n"
+
+    def iter_clear_pocket(self, x_start, y_start, z_depth, width, height, tool_diameter, safe_z, step_down, stepover, z_top=0):
+        """Clears a pocket from z_top (its floor when it was partly cleared before) down to z_depth.
+
+        Every layer is entered on a ramp at a corner, traces each wall once back to that corner,
+        then clears the inside with zig-zag rows. The next layer starts at the corner nearest to
+        where the rows ended, so the tool stays down between layers. Starts and ends at safe_z.
+        """
+
+        x0, x1 = tool_span(x_start, width, tool_diameter)
+        y0, y1 = tool_span(y_start, height, tool_diameter)
+
+        # Rows between the walls, the walls themselves are cut by the perimeter
+        rows = [y0]
+        while rows[-1] + stepover < y1:
+            rows.append(rows[-1] + stepover)
+        rows = rows[1:]
+
+        yield f"G0 X{x0} Y{y0}\n"
+        yield f"G0 Z{z_top + min(CLEARANCE, safe_z)}\n"
+
+        x_pos, y_pos = corner_x, corner_y = x0, y0
+        current_z = z_top
+        while current_z > z_depth:
+            current_z = max(current_z - step_down, z_depth)
+            other_x = x1 if corner_x == x0 else x0
+            other_y = y1 if corner_y == y0 else y0
+
+            # The rows of the previous layer ended on the wall of this corner
+            if y_pos != corner_y:
+                yield f"G1 Y{corner_y}\n"
+
+            # Ramp down along the first wall (or the slot) and back, a plunge when there is no room
+            if x1 > x0:
+                ramp = math.copysign(min(RAMP_LENGTH, x1 - x0), other_x - corner_x)
+                yield f"G1 X{corner_x + ramp} Z{current_z}\n"
+                yield f"G1 X{corner_x}\n"
+            elif y1 > y0:
+                ramp = math.copysign(min(RAMP_LENGTH, y1 - y0), other_y - corner_y)
+                yield f"G1 Y{corner_y + ramp} Z{current_z}\n"
+                yield f"G1 Y{corner_y}\n"
+            else:
+                yield f"G1 Z{current_z}\n"
+
+            if x1 > x0 and y1 > y0:
+                # Walls, once each, back to the corner
+                yield f"G1 X{other_x}\n"
+                yield f"G1 Y{other_y}\n"
+                yield f"G1 X{corner_x}\n"
+                yield f"G1 Y{corner_y}\n"
+                x_pos, y_pos = corner_x, corner_y
+
+                # Zig-zag over the rows, from the side of the corner
+                for y_pos in (rows if corner_y == y0 else reversed(rows)):
+                    yield f"G1 Y{y_pos}\n"
+                    x_pos = other_x if x_pos == corner_x else corner_x
+                    yield f"G1 X{x_pos}\n"
+                corner_x, corner_y = x_pos, other_y
+            elif x1 > x0:
+                # A slot is cut end to end, every layer in the opposite direction
+                yield f"G1 X{other_x}\n"
+                x_pos = corner_x = other_x
+            elif y1 > y0:
+                yield f"G1 Y{other_y}\n"
+                y_pos = corner_y = other_y
+
+        yield f"G0 Z{safe_z}\n"
 
-        return gcode
+    def iter_drill_cycle(self, holes, diameter, safe_z):
+        """Drills the holes with canned cycles, G83 pecking for the deep ones. Starts and ends at safe_z."""
+
+        retract = min(CLEARANCE, safe_z)
+
+        for x_pos, y_pos, z_depth in holes:
+            if -z_depth > PECK_DEPTH_RATIO * diameter:
+                yield f"G99 G83 X{x_pos} Y{y_pos} Z{z_depth} R{retract} Q{diameter}\n"
+            else:
+                yield f"G99 G81 X{x_pos} Y{y_pos} Z{z_depth} R{retract}\n"
+        yield "G80\n"
+        yield f"G0 Z{safe_z}\n"
 
     def mill_pocket(self, x_start, y_start, z_depth, width, height, tool_diameter, safe_z, step_down):
         """Generates G-code to mill a pocket."""
 
-        gcode = ""
+        return "".join(self.iter_mill_pocket(x_start, y_start, z_depth, width, height, tool_diameter, safe_z, step_down))
+
+    def iter_mill_pocket(self, x_start, y_start, z_depth, width, height, tool_diameter, safe_z, step_down):
         current_z = 0
         while current_z > z_depth:
             current_z -= step_down
-            gcode += f"G0 Z{safe_z}\n"
-            gcode += f"G0 X{x_start + tool_diameter/2} Y{y_start + tool_diameter/2}\n"
-            gcode += f"G1 Z{current_z}\n"
-            gcode += f"G1 X{x_start + width - tool_diameter/2}\n"
-            gcode += f"G1 Y{y_start + height - tool_diameter/2}\n"
-            gcode += f"G1 X{x_start + tool_diameter/2}\n"
-            gcode += f"G1 Y{y_start + tool_diameter/2}\n"
-        gcode += f"G0 Z{safe_z}\n"
-        return gcode
+            yield f"G0 Z{safe_z}\n"
+            yield f"G0 X{x_start + tool_diameter/2} Y{y_start + tool_diameter/2}\n"
+            yield f"G1 Z{current_z}\n"
+            yield f"G1 X{x_start + width - tool_diameter/2}\n"
+            yield f"G1 Y{y_start + height - tool_diameter/2}\n"
+            yield f"G1 X{x_start + tool_diameter/2}\n"
+            yield f"G1 Y{y_start + tool_diameter/2}\n"
+        yield f"G0 Z{safe_z}\n"
 
     def drill_hole(self, x_pos, y_pos, z_depth, diameter, safe_z):
         """Generates G-code to drill a hole."""
 
-        gcode = ""
-        gcode += f"G0 Z{safe_z}\n"
-        gcode += f"G0 X{x_pos} Y{y_pos}\n"
-        gcode += f"G1 Z{z_depth}\n"  # Use a drilling cycle (e.g., G81) if supported
-        gcode += f"G0 Z{safe_z}\n"
-        return gcode
\ No newline at end of file
+        return "".join(self.iter_drill_hole(x_pos, y_pos, z_depth, diameter, safe_z))
+
+    def iter_drill_hole(self, x_pos, y_pos, z_depth, diameter, safe_z):
+        yield f"G0 Z{safe_z}\n"
+        yield f"G0 X{x_pos} Y{y_pos}\n"
+        yield f"G1 Z{z_depth}\n"  # Use a drilling cycle (e.g., G81) if supported
+        yield f"G0 Z{safe_z}\n"
+
+
+def iter_chunks(lines, size=STREAM_CHUNK_LINES):
+    """Groups G-code lines into chunks of at most size lines for streaming."""
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def tool_span(start, size, tool_diameter):
+    """First and last tool centre positions inside a pocket side, the middle when the tool does not fit."""
+
+    low = start + tool_diameter / 2
+    high = start + size - tool_diameter / 2
+    if high < low:
+        low = high = start + size / 2
+    return low, high
+
+
+def pocket_entry(x_start, y_start, z_depth, width, height, tool_diameter):
+    return tool_span(x_start, width, tool_diameter)[0], tool_span(y_start, height, tool_diameter)[0]
+
+
+def contains(outer, inner):
+    """True when the (x_start, y_start, z_depth, width, height) pocket outer covers inner in X and Y."""
+
+    return (
+        outer[0] <= inner[0] and inner[0] + inner[3] <= outer[0] + outer[3]
+        and outer[1] <= inner[1] and inner[1] + inner[4] <= outer[1] + outer[4]
+    )
+
+
+def nesting(pocket, pockets):
+    """Number of the pockets covering pocket in X and Y, itself included."""
+
+    return sum(contains(other, pocket) for other in pockets)
+
+
+def order_nearest(items, position, point):
+    """Orders items by repeatedly visiting the nearest remaining one."""
+
+    remaining = list(items)
+    ordered = []
+    while remaining:
+        nearest = min(remaining, key=lambda item: math.dist(position, point(item)))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+        position = point(nearest)
+    return ordered
+
+
+def estimate_cycle_time(lines, feed_rate, rapid_rate=RAPID_RATE):
+    """Rough machining time in seconds of a program: move lengths over the feed or rapid rate.
+
+    Drilling cycles are counted as a feed to depth and a rapid back to the retract plane.
+    """
+
+    position = (0.0, 0.0, 0.0)
+    motion = 'G0'
+    minutes = 0.0
+    for line in lines:
+        words = line.split()
+        codes = [word for word in words if word[0] == 'G']
+        values = {word[0]: float(word[1:]) for word in words if word[0] in 'XYZR'}
+
+        for code in codes:
+            if code in ('G0', 'G1', 'G80', 'G81', 'G83'):
+                motion = code
+        if not {'X', 'Y', 'Z'} & values.keys() or motion == 'G80':
+            continue
+
+        target = (values.get('X', position[0]), values.get('Y', position[1]), values.get('Z', position[2]))
+
+        if motion in ('G81', 'G83'):
+            retract = values.get('R', position[2])
+            minutes += math.dist(position[:2], target[:2]) / rapid_rate + abs(position[2] - retract) / rapid_rate
+            minutes += (retract - target[2]) / feed_rate + (retract - target[2]) / rapid_rate
+            position = (target[0], target[1], retract)
+        else:
+            minutes += math.dist(position, target) / (rapid_rate if motion == 'G0' else feed_rate)
+            position = target
+
+    return minutes * 60
@@ -0,0 +1,121 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Inputs every check depends on: (length, material symbols, load symbols, design strengths),
+# compression reads no length. A check is only recomputed when one of its inputs, or the
+# section sizes, changed.
+CHECK_DEPENDENCIES = {
+    'bending': ('L', (), ('P_L', 'M_L', 'I_L'), ('fm_d_p', 'fm_d_m', 'fm_d_i')),
+    'shear': ('L', (), ('P_L', 'M_L', 'I_L'), ('fv_d_p', 'fv_d_m', 'fv_d_i')),
+    'sls': ('L', ('E', 'K_def'), ('SLS_L', 'gk', 'g_lead', 'g_acmp', 'psi_lead', 'psi_acmp'), ()),
+    'compression': (None, (), ('P_clm', 'M_clm', 'I_clm'), ('fc_d_p', 'fc_d_m', 'fc_d_i')),
+    'buckling_y': ('L_clm', ('fc_k', 'E_0_G_05', 'B_c'), ('P_clm',), ('fc_d_m',)),
+    'buckling_z': ('L_clm', ('fc_k', 'E_0_G_05', 'B_c'), ('P_clm',), ('fc_d_m',)),
+}
+
+# Bounds of the memo of check results, the least recently used are evicted first
+MEMO_MAX_ENTRIES = 4096
+MEMO_MAX_BYTES = 64 * 1024 * 1024
+
+
+def fingerprint(*values):
+    """Hash of scalars and arrays by shape and value, equal inputs give equal fingerprints."""
+
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        array = np.ascontiguousarray(value, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def check_fingerprint(check, W, T, L, L_clm, m, ld, fd):
+    length, material, load, strengths = CHECK_DEPENDENCIES[check]
+    lengths = {'L': (L,), 'L_clm': (L_clm,), None: ()}[length]
+    return fingerprint(
+        W, T, *lengths,
+        *(m[symbol] for symbol in material),
+        *(ld[symbol] for symbol in load),
+        *(fd[field] for field in strengths)
+    )
+
+
+class CheckMemo:
+    """Utilisations of the checks by the fingerprint of their inputs, bounded in entries and bytes.
+
+    Shared between requests: when a what-if edit only changes some inputs, the checks that do
+    not depend on them are served from the memo. The stored arrays are read-only.
+    """
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES, max_bytes=MEMO_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def _count(self, check, outcome):
+        counts = self._counts.setdefault(check, {'hits': 0, 'misses': 0})
+        counts[outcome] += 1
+
+    def evaluate(self, check, evaluate, W, T, L, L_clm, m, ld, fd):
+        """Utilisation of the check, evaluate(check, W, T, L, L_clm, m, ld, fd) when it is not memoized."""
+
+        key = (check, check_fingerprint(check, W, T, L, L_clm, m, ld, fd))
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._count(check, 'hits')
+                return value
+            self._count(check, 'misses')
+
+        value = np.asarray(evaluate(check, W, T, L, L_clm, m, ld, fd))
+        value.flags.writeable = False
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            self._entries[key] = value
+            self._size += value.nbytes
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'checks': {check: dict(counts) for check, counts in self._counts.items()},
+            }
+
+
+# Memo of the incremental requests of this process
+check_memo = CheckMemo()
+
+
+def memo_for(data):
+    """The check memo when a request opts in with "incremental": true, None otherwise."""
+
+    return check_memo if data.get('incremental') else None
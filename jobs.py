@@ -0,0 +1,150 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from process_pool import get_pool
+import tasks
+
+# Jobs that may wait or run at the same time, further submissions are refused
+JOB_QUEUE_SIZE = 32
+
+# Finished jobs kept for polling, the oldest are dropped first
+JOB_HISTORY_SIZE = 256
+
+# Designs per unit of work of a design_verify job, progress is reported per unit
+JOB_CHUNK_SIZE = 1000
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def split_designs(data):
+    designs = data.get('designs') or []
+    return [
+        data | {'designs': designs[start:start + JOB_CHUNK_SIZE]}
+        for start in range(0, len(designs), JOB_CHUNK_SIZE)
+    ] or [data]
+
+
+def merge_designs(results):
+    merged = {'acceptable_designs': [design for result in results for design in result['acceptable_designs']]}
+    if 'governing_checks' in results[0]:
+        merged['governing_checks'] = [check for result in results for check in result['governing_checks']]
+    return merged
+
+
+# Tasks split into several units of work: (split, merge)
+CHUNKED_TASKS = {
+    'design_verify': (split_designs, merge_designs),
+}
+
+
+class Job:
+    def __init__(self, task, futures, merge):
+        self.id = uuid.uuid4().hex
+        self.task = task
+        self.futures = futures
+        self.merge = merge
+        self.cancel_requested = False
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    def finished(self):
+        return all(future.done() for future in self.futures)
+
+    def status(self):
+        done = sum(future.done() for future in self.futures)
+
+        if self.cancel_requested:
+            status = "cancelled" if done == len(self.futures) else "cancelling"
+        elif any(not future.cancelled() and future.done() and future.exception() for future in self.futures):
+            status = "failed"
+        elif done == len(self.futures):
+            status = "done"
+        elif done or any(future.running() for future in self.futures):
+            status = "running"
+        else:
+            status = "queued"
+
+        if done == len(self.futures) and self.finished_at is None:
+            self.finished_at = time.time()
+
+        return {
+            'job_id': self.id,
+            'task': self.task,
+            'status': status,
+            'progress': round(done / len(self.futures), 4),
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+        }
+
+    def exception(self):
+        """The exception of the first failed unit of work, None when none failed."""
+
+        for future in self.futures:
+            if not future.cancelled() and future.done() and future.exception():
+                return future.exception()
+        return None
+
+    def error(self):
+        exception = self.exception()
+        return str(exception) if exception is not None else None
+
+    def result(self):
+        return self.merge([future.result() for future in self.futures])
+
+
+class JobManager:
+    """Runs endpoint calculations as background jobs on the shared process pool.
+
+    At most max_pending jobs are queued or running at a time, so heavy jobs cannot pile up
+    behind the interactive endpoints.
+    """
+
+    def __init__(self, max_pending=JOB_QUEUE_SIZE, history_size=JOB_HISTORY_SIZE):
+        self.max_pending = max_pending
+        self.history_size = history_size
+
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished()]
+        for job_id in finished[:max(len(finished) - self.history_size, 0)]:
+            del self._jobs[job_id]
+
+    def submit(self, task, data):
+        if task not in tasks.TASKS:
+            raise ValueError(f"Unknown task: {task}")
+
+        with self._lock:
+            self._prune()
+            pending = sum(not job.finished() for job in self._jobs.values())
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} jobs)")
+
+            split, merge = CHUNKED_TASKS.get(task, (lambda data: [data], lambda results: results[0]))
+            futures = [get_pool().submit(tasks.TASKS[task], part) for part in split(data)]
+
+            job = Job(task, futures, merge)
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels the units of work that have not started, running ones finish and are discarded."""
+
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        if not job.finished():
+            job.cancel_requested = True
+            for future in job.futures:
+                future.cancel()
+        return job
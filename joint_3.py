@@ -1,9 +1,16 @@
 import math
+import numpy as np
+from cross_section_optimiser import is_number
+from materials import resolve_material
+
+# Step (inches) between the peg diameters evaluated by default
+D_STEP = 0.02
 
 class Joint_3:
-    def __init__(self, material, cross_section):
-        self.material = material
+    def __init__(self, material, cross_section, search=None):
+        self.material = resolve_material(material)
         self.cross_section = cross_section
+        self.search = search or {}
         
         # Input parameters ( we are iterating over it D)
         self.w = self.cross_section.get('column_h') or 100        # 100 mm: Column height
@@ -33,57 +40,90 @@ class Joint_3:
         self.ts = self.tm
         self.required_load_kN = self.required_load * 0.00444822
 
+        # Resolution of the peg diameter
+        self.d_step = self.search.get('d_step')
+        if self.d_step is None:
+            self.d_step = D_STEP
+        if not is_number(self.d_step) or not 0.0001 <= self.d_step <= 0.5:
+            raise ValueError("d_step must be a number between 0.0001 and 0.5 inches")
+
+    # Peg diameters D (inches) evaluated by the solver
+    def diameters(self):
+        # D runs over the multiples of d_step from 0.5 to a quarter of the column width, counted in
+        # integers so the default step of 0.02 gives exactly the historical values. The first
+        # multiple is rounded up, so no diameter is below 0.5 for steps that do not divide 0.5
+        steps_per_inch = 1 / self.d_step
+        first = math.ceil(round(0.5 * steps_per_inch, 9))
+        last = int((self.b_clmn / 4) * steps_per_inch)
+        return np.arange(first, last + 1) / steps_per_inch
+
+    # Capacity, equivalent bolt diameter limits and status of every peg diameter in one sweep
+    def capacity_curve(self, D):
+        # 1. Calculate Capacity Components
+        PId = (self.n * D * self.tm * self.F_ed) / 2
+        PIm = (self.n * D * self.tm * self.F_em) / 2
+        PIs = self.n * D * self.ts * self.F_es
+        PVd = (self.n * np.pi * (D ** 2) * self.tau_c) / 4
+
+        # 2. Find Overall Capacity
+        capacity = np.minimum(np.minimum(PId, PIm), np.minimum(PIs, PVd))
+
+        # 3. Calculate Equivalent Steel Diameter Bolt
+        Z = capacity
+        d_im = (4 * self.Ke * Z) / (self.tm * self.F_em)
+        d_is = (2 * self.Ke * Z) / (self.ts * self.F_es)
+        d_iiis = (1.6 * self.Ke * Z * (2 + self.Re)) / (self.k3 * self.ts * self.F_em)
+        d_iv = (np.sqrt((1.6 * self.Ke * Z * math.sqrt(3 * (1 + self.Re))) / math.sqrt(2 * self.F_em * self.F_es))) / 2
+
+        d_eq = np.maximum(np.maximum(d_im, d_is), np.maximum(d_iiis, d_iv))
+
+        # 4. Calculate Limits for Placement of the Dowel
+        lim_e = self.dtl_e * d_eq
+        lim_s = self.dtl_s * d_eq
+        lim_v = self.dtl_v * d_eq
+        lim_g = self.dtl_g * d_eq
+
+        # 5. Check if the Joint is Strong Enough
+        acceptable = (capacity >= self.required_load) & (lim_v + lim_e < self.b_clmn) & ((2 * lim_g) + lim_s < self.w_t)
+
+        return {
+            'capacity': capacity,
+            'lim_e': lim_e,
+            'lim_s': lim_s,
+            'lim_v': lim_v,
+            'lim_g': lim_g,
+            'acceptable': acceptable,
+        }
+
     # Calculate the capacity of the peg and spacing requirements 
     def calculate_capacity_and_status_for_graph(self):
-            max_capacity = 0
+            D = self.diameters()
+            curve = self.capacity_curve(D)
+
+            # 6. Keep the acceptable diameter with the highest capacity (the first one on ties)
             best_iteration = None
-            
-            # Iterate over D values, converting floats to ints
-            for D in range(int(0.5 * 100), int((self.b_clmn / 4) * 100) + 1, int(0.02 * 100)): 
-                D = D / 100  # Convert back to float for calculations
-
-                # 1. Calculate Capacity Components
-                PId = (self.n * D * self.tm * self.F_ed) / 2
-                PIm = (self.n * D * self.tm * self.F_em) / 2
-                PIs = self.n * D * self.ts * self.F_es
-                PVd = (self.n * math.pi * (D ** 2) * self.tau_c) / 4
-
-                # 2. Find Overall Capacity
-                capacity = min(PId, PIm, PIs, PVd)
-
-                # 3. Calculate Equivalent Steel Diameter Bolt
-                Z = capacity 
-                d_im = (4 * self.Ke * Z) / (self.tm * self.F_em)
-                d_is = (2 * self.Ke * Z) / (self.ts * self.F_es)
-                d_iiis = (1.6 * self.Ke * Z * (2 + self.Re)) / (self.k3 * self.ts * self.F_em)
-                d_iv = (math.sqrt((1.6 * self.Ke * Z * math.sqrt(3 * (1 + self.Re))) / math.sqrt(2 * self.F_em * self.F_es))) / 2  
-
-                d_eq = max(d_im, d_is, d_iiis, d_iv)
-
-                # 4. Calculate Limits for Placement of the Dowel
-                lim_e = self.dtl_e * d_eq
-                lim_s = self.dtl_s * d_eq
-                lim_v = self.dtl_v * d_eq
-                lim_g = self.dtl_g * d_eq
-
-                # 5. Check if the Joint is Strong Enough
-                if capacity >= self.required_load and lim_v + lim_e < self.b_clmn and (2 * lim_g) + lim_s < self.w_t:
-                    status = "Acceptable"
-                else:
-                    status = "Not Acceptable"
-
-                # 6. If the status is acceptable and capacity is higher, store the iteration
-                if status == "Acceptable" and capacity > max_capacity:
-                    max_capacity = capacity
-                    best_iteration = {
-                        "D_mm": D * 25.4,
-                        "lim_e_mm": lim_e * 25.4,
-                        "lim_s_mm": lim_s * 25.4,
-                        "lim_v_mm": lim_v * 25.4,
-                        "lim_g_mm": lim_g * 25.4,
-                        "capacity_kN": capacity * 0.00444822,
-                        "status": status
+            if curve['acceptable'].any():
+                best = int(np.argmax(np.where(curve['acceptable'], curve['capacity'], -np.inf)))
+                best_iteration = {
+                    "D_mm": D[best] * 25.4,
+                    "lim_e_mm": curve['lim_e'][best] * 25.4,
+                    "lim_s_mm": curve['lim_s'][best] * 25.4,
+                    "lim_v_mm": curve['lim_v'][best] * 25.4,
+                    "lim_g_mm": curve['lim_g'][best] * 25.4,
+                    "capacity_kN": curve['capacity'][best] * 0.00444822,
+                    "status": "Acceptable"
+                }
+
+            # Full capacity curve for the graph, on request
+            graph = {}
+            if self.search.get('curve'):
+                graph = {
+                    "curve": {
+                        "D_mm": np.round(D * 25.4, 2).tolist(),
+                        "capacity_kN": np.round(curve['capacity'] * 0.00444822, 2).tolist(),
+                        "status": curve['acceptable'].tolist()
                     }
+                }
 
             # Print the best iteration (if any acceptable iteration found)
             if best_iteration:
@@ -116,8 +156,8 @@ class Joint_3:
                         'print_value': f"{best_iteration['status']}",
                         'value': best_iteration['status'] == "Acceptable"
                     }
-                }
+                } | graph
 
             else:
-                return {}
+                return graph
 
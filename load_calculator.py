@@ -1,8 +1,17 @@
 import math
+from functools import lru_cache
+from materials import resolve_material
+from metrics import LRU_CACHES, stage
+
+# Number of distinct load-relevant inputs kept by the cross-request load cache
+LOAD_CACHE_SIZE = 1024
+
+# Number of distinct building geometries kept by the cross-request wind cache
+WIND_CACHE_SIZE = 256
 
 class LoadCaluculator: 
     def __init__(self, material, footprint):
-        self.material = material
+        self.material = resolve_material(material)
         self.footprint = footprint
 
         # Inputs for dead load calculation
@@ -21,6 +30,8 @@ class LoadCaluculator:
         self.altitude = 2     #"Enter the altitude of the site: "))
         self.s_g = 1          #"Enter the Characteristic value of snow load (s.g): "))
 
+        self._wind_state = None
+
 
     # Functions from the first code
     def calculate_kr(self, z0):
@@ -156,6 +167,13 @@ class LoadCaluculator:
         sk_clm= ((snow_load)/ n)
         return sk_clm
         
+    def wind_state(self):
+        """Peak velocity pressure, direct/side wind pressures and zone widths of this building."""
+
+        if self._wind_state is None:
+            self._wind_state = calculate_wind_state(self.h, self.W_sl, self.L_sl, self.z0, self.c0, self.vb0)
+        return self._wind_state
+
     ########################################calculating results########################################
     
     def Beam_load_combinations(self):
@@ -188,25 +206,10 @@ class LoadCaluculator:
         sk= 3.5*self.calculate_snow_load(self.W_sl, self.L_sl)
 
         # Get the wind load inputs
-        z = self.h       #input("Enter the height at which the wind speed is considered (z) in (m)
-        b = self.W_sl    #input("Enter the width of the building b (m)
         d = self.L_sl    #input("Enter the length of the building d (m)
-    
 
-        # Calculating kr, Iv, Vm, and qp using the first code's functions
-        kr = self.calculate_kr(self.z0)
-        Iv = self.calculate_turbulence_intensity(1, self.c0, z, self.z0)
-        vm = self.calculate_mean_wind_velocity(kr, self.c0, self.vb0, z, self.z0)
-        qp = self.calculate_peak_wind_velocity_pressure(Iv, 1.25, vm)  # rho is 1.25 kg/m^3
-        
-
-        # Calculate for direct wind
-        We_direct, widths_direct = self.calculate_wind_pressure(qp, b, d, self.h)
-        
-
-        # Calculate for side wind (just swapping b and d)
-        We_side, widths_side = self.calculate_wind_pressure(qp, d, b, self.h)
-        
+        # Wind pressures are computed once and shared by the beam and column combinations
+        qp, We_direct, widths_direct, We_side, widths_side = self.wind_state()
 
         # Calculate wind loads
         wk = (5*self.calculate_loads(We_direct, We_side, widths_direct, self.h, d, self.n))
@@ -357,22 +360,10 @@ class LoadCaluculator:
         sk_clm= self.calculate_snow_load_clm(self.W_sl,self.L_sl,self.n)
 
         # Get the wind load inputs
-        z = self.h       #input("Enter the height at which the wind speed is considered (z) in (m)
-        b = self.W_sl    #input("Enter the width of the building b (m)
         d = self.L_sl    #input("Enter the length of the building d (m)
-        
 
-        # Calculating kr, Iv, Vm, and qp using the first code's functions
-        kr = self.calculate_kr(self.z0)
-        Iv = self.calculate_turbulence_intensity(1, self.c0, z, self.z0)
-        vm = self.calculate_mean_wind_velocity(kr, self.c0, self.vb0, z, self.z0)
-        qp = self.calculate_peak_wind_velocity_pressure(Iv, 1.25, vm)  # rho is 1.25 kg/m^3
-
-        # Calculate for direct wind
-        We_direct, widths_direct = self.calculate_wind_pressure(qp, b, d, self.h)
-
-        # Calculate for side wind (just swapping b and d)
-        We_side, widths_side =  self.calculate_wind_pressure(qp, d, b, self.h)
+        # Wind pressures are computed once and shared by the beam and column combinations
+        qp, We_direct, widths_direct, We_side, widths_side = self.wind_state()
 
         # Calculate wind loads
         wk_clm = 3* self.calculate_loads_clm(We_direct, We_side, widths_direct, self.h, d, self.n)
@@ -449,4 +440,105 @@ class LoadCaluculator:
         # Call the function to run the combined code
         column_load_combinations = self.column_load_combinations()
         
-        return beam_load_combinations | column_load_combinations
\ No newline at end of file
+        return beam_load_combinations | column_load_combinations
+
+
+@lru_cache(maxsize=WIND_CACHE_SIZE)
+def calculate_wind_state(h, b, d, z0, c0, vb0):
+    """Wind state for a building of height h, width b and length d, shared across requests.
+
+    Returns (qp, We_direct, widths_direct, We_side, widths_side). The returned dicts are shared between callers and must be treated as read-only.
+    """
+
+    calculator = LoadCaluculator({}, {})
+    z = h       # the height at which the wind speed is considered
+
+    # Calculating kr, Iv, Vm, and qp using the first code's functions
+    kr = calculator.calculate_kr(z0)
+    Iv = calculator.calculate_turbulence_intensity(1, c0, z, z0)
+    vm = calculator.calculate_mean_wind_velocity(kr, c0, vb0, z, z0)
+    qp = calculator.calculate_peak_wind_velocity_pressure(Iv, 1.25, vm)  # rho is 1.25 kg/m^3
+
+    # Calculate for direct wind
+    We_direct, widths_direct = calculator.calculate_wind_pressure(qp, b, d, h)
+
+    # Calculate for side wind (just swapping b and d)
+    We_side, widths_side = calculator.calculate_wind_pressure(qp, d, b, h)
+
+    return qp, We_direct, widths_direct, We_side, widths_side
+
+
+def wind_cache_info():
+    """Hit/miss counters and size of the wind cache."""
+
+    return calculate_wind_state.cache_info()
+
+
+def load_key(material, footprint):
+    """Canonical key of the inputs the load calculation depends on.
+
+    Defaults are resolved and every value is converted to float, so requests that only differ
+    in how they spell the same footprint (missing vs default, 2 vs 2.0) share one key.
+    """
+
+    calculator = LoadCaluculator(material, footprint)
+    return (
+        float(calculator.rho),
+        float(calculator.T_sl),
+        float(calculator.W_sl),
+        float(calculator.L_sl),
+        float(calculator.h),
+        float(calculator.n),
+    )
+
+
+@lru_cache(maxsize=LOAD_CACHE_SIZE)
+def _calculate_for_key(key):
+    rho, T_sl, W_sl, L_sl, h, n = key
+    return LoadCaluculator(
+        {
+            'density': rho
+        },{
+            'slab_thickness': T_sl,
+            'width': W_sl,
+            'length': L_sl,
+            'height': h,
+            'column_number': n
+        }
+    ).calculator()
+
+
+def cached_calculator(material, footprint):
+    """Same result as LoadCaluculator(material, footprint).calculator(), served from a bounded LRU.
+
+    The returned dict is shared between callers and must be treated as read-only.
+    """
+
+    with stage('load_calculation'):
+        return _calculate_for_key(load_key(material, footprint))
+
+
+def load_cache_info():
+    """Hit/miss counters and size of the load cache."""
+
+    return _calculate_for_key.cache_info()
+
+
+def cache_stats():
+    """Hit/miss counters and sizes of the wind and load caches."""
+
+    return {
+        'wind': wind_cache_info()._asdict(),
+        'load': load_cache_info()._asdict(),
+    }
+
+
+def clear_caches():
+    """Empties the wind and load caches and resets their counters."""
+
+    calculate_wind_state.cache_clear()
+    _calculate_for_key.cache_clear()
+
+
+LRU_CACHES.register('wind_state', wind_cache_info)
+LRU_CACHES.register('load_calculation', load_cache_info)
@@ -0,0 +1,157 @@
+import numpy as np
+
+from section_checks import MATERIAL_DEFAULTS, design_strengths, material_inputs
+
+# Strength classes of EN 338 (solid timber) and EN 14080 (glulam):
+# (id, family, bending strength, compression parallel strength, shear strength,
+#  E-modulus mean, E-modulus 5% (GPa), mean density (kg/m³))
+STRENGTH_CLASSES = [
+    ('C14', 'solid', 14, 16, 4.0, 7.0, 4.7, 350),
+    ('C16', 'solid', 16, 17, 4.0, 8.0, 5.4, 370),
+    ('C18', 'solid', 18, 18, 4.0, 9.0, 6.0, 380),
+    ('C20', 'solid', 20, 19, 4.0, 9.5, 6.4, 400),
+    ('C22', 'solid', 22, 20, 4.0, 10.0, 6.7, 410),
+    ('C24', 'solid', 24, 21, 4.0, 11.0, 7.4, 420),
+    ('C27', 'solid', 27, 22, 4.0, 11.5, 7.7, 430),
+    ('C30', 'solid', 30, 24, 4.0, 12.0, 8.0, 460),
+    ('C35', 'solid', 35, 25, 4.0, 13.0, 8.7, 470),
+    ('C40', 'solid', 40, 27, 4.0, 14.0, 9.4, 480),
+    ('C45', 'solid', 45, 29, 4.0, 15.0, 10.1, 490),
+    ('C50', 'solid', 50, 30, 4.0, 16.0, 10.7, 520),
+    ('D18', 'solid', 18, 18, 3.5, 9.5, 8.0, 570),
+    ('D24', 'solid', 24, 21, 3.7, 10.0, 8.5, 580),
+    ('D30', 'solid', 30, 24, 3.9, 11.0, 9.2, 640),
+    ('D35', 'solid', 35, 25, 4.1, 12.0, 10.1, 650),
+    ('D40', 'solid', 40, 27, 4.2, 13.0, 10.9, 660),
+    ('D45', 'solid', 45, 29, 4.4, 13.5, 11.3, 700),
+    ('D50', 'solid', 50, 30, 4.5, 14.0, 11.8, 740),
+    ('D60', 'solid', 60, 33, 4.8, 17.0, 14.3, 840),
+    ('D70', 'solid', 70, 36, 5.0, 20.0, 16.8, 1080),
+    ('GL20h', 'glulam', 20, 20, 3.5, 8.4, 7.0, 370),
+    ('GL22h', 'glulam', 22, 22, 3.5, 10.5, 8.8, 410),
+    ('GL24h', 'glulam', 24, 24, 3.5, 11.5, 9.6, 420),
+    ('GL26h', 'glulam', 26, 26, 3.5, 12.1, 10.1, 445),
+    ('GL28h', 'glulam', 28, 28, 3.5, 12.6, 10.5, 460),
+    ('GL30h', 'glulam', 30, 30, 3.5, 13.6, 11.3, 480),
+    ('GL32h', 'glulam', 32, 32, 3.5, 14.2, 11.8, 490),
+    ('GL20c', 'glulam', 20, 18.5, 3.5, 10.4, 8.6, 390),
+    ('GL22c', 'glulam', 22, 20, 3.5, 10.4, 8.6, 390),
+    ('GL24c', 'glulam', 24, 21.5, 3.5, 11.0, 9.1, 400),
+    ('GL26c', 'glulam', 26, 23.5, 3.5, 12.0, 10.0, 420),
+    ('GL28c', 'glulam', 28, 24, 3.5, 12.5, 10.4, 420),
+    ('GL30c', 'glulam', 30, 24.5, 3.5, 13.0, 10.8, 430),
+    ('GL32c', 'glulam', 32, 24.5, 3.5, 13.5, 11.2, 440),
+]
+
+# Factors of each family of products: partial factor and factor for the straightness of members
+FAMILY_FACTORS = {
+    'solid': {'y_m': 1.3, 'B_c': 0.2},
+    'glulam': {'y_m': 1.25, 'B_c': 0.1},
+}
+
+# Modification and creep factors of service class 3, the shelters stand outdoors
+SERVICE_CLASS_FACTORS = {'kmod_p': 0.5, 'kmod_m': 0.65, 'kmod_i': 0.9, 'K_def': 2}
+
+# Design strengths derived from the inputs, precomputed for every class of the library
+STRENGTH_FIELDS = (
+    'fm_d_p', 'fm_d_m', 'fm_d_i',
+    'fv_d_p', 'fv_d_m', 'fv_d_i',
+    'fc_d_p', 'fc_d_m', 'fc_d_i',
+)
+
+MATERIAL_DTYPE = np.dtype(
+    [('id', 'U8'), ('family', 'U8')]
+    + [(symbol, 'f8') for symbol in MATERIAL_DEFAULTS]
+    + [(field, 'f8') for field in STRENGTH_FIELDS]
+)
+
+
+class LibraryInputs(dict):
+    """Material inputs of an unmodified library class, carrying its precomputed design strengths.
+
+    Shared between requests, so it must not be modified.
+    """
+
+    def __init__(self, inputs, strengths):
+        super().__init__(inputs)
+        self.strengths = strengths
+
+
+def build_library():
+    """Structured array of the strength classes, one row per class, design strengths included."""
+
+    library = np.zeros(len(STRENGTH_CLASSES), dtype=MATERIAL_DTYPE)
+    for row, (material_id, family, fm_k, fc_k, fv_k, E, E_0_G_05, rho) in zip(library, STRENGTH_CLASSES):
+        inputs = dict(fm_k=fm_k, fc_k=fc_k, fv_k=fv_k, E=E, E_0_G_05=E_0_G_05, rho=rho)
+        inputs |= FAMILY_FACTORS[family] | SERVICE_CLASS_FACTORS
+        row['id'] = material_id
+        row['family'] = family
+        for symbol, value in inputs.items():
+            row[symbol] = value
+
+    # One vectorized pass over the columns of the library
+    strengths = design_strengths({symbol: library[symbol] for symbol in MATERIAL_DEFAULTS})
+    for field in STRENGTH_FIELDS:
+        library[field] = strengths[field]
+    return library
+
+
+MATERIALS = build_library()
+MATERIAL_INDEX = {material_id: index for index, material_id in enumerate(MATERIALS['id'])}
+
+# Inputs of every class, as the calculations read them, built once
+LIBRARY_INPUTS = {
+    str(row['id']): LibraryInputs(
+        {symbol: float(row[symbol]) for symbol in MATERIAL_DEFAULTS},
+        {field: float(row[field]) for field in STRENGTH_FIELDS}
+    )
+    for row in MATERIALS
+}
+
+
+def reference(material):
+    """(id, overrides) of a request material: "C24" or {"id": "C24", ...overrides}, id None for plain values."""
+
+    if isinstance(material, str):
+        return material, {}
+    if isinstance(material, dict) and material.get('id') is not None:
+        return material['id'], {key: value for key, value in material.items() if key != 'id' and value is not None}
+    return None, material or {}
+
+
+def library_inputs(material_id):
+    if material_id not in LIBRARY_INPUTS:
+        raise ValueError(f"Unknown material: {material_id}, expected one of {', '.join(LIBRARY_INPUTS)}")
+    return LIBRARY_INPUTS[material_id]
+
+
+def resolve_material(material):
+    """Request material with a library reference replaced by the values of its class, overrides applied."""
+
+    material_id, overrides = reference(material)
+    if material_id is None:
+        return overrides
+
+    inputs = library_inputs(material_id)
+    return {key: inputs[symbol] for symbol, (key, _) in MATERIAL_DEFAULTS.items()} | overrides
+
+
+def resolve_inputs(material):
+    """Material inputs of a request, the precomputed ones for a library class without overrides."""
+
+    material_id, overrides = reference(material)
+    if material_id is not None and not overrides:
+        return library_inputs(material_id)
+    return material_inputs(resolve_material(material))
+
+
+def describe(material_id):
+    """A library class in the request keys, with its design strengths."""
+
+    inputs = library_inputs(material_id)
+    return {
+        'id': material_id,
+        'family': str(MATERIALS[MATERIAL_INDEX[material_id]]['family']),
+        **{key: inputs[symbol] for symbol, (key, _) in MATERIAL_DEFAULTS.items()},
+        'design_strengths': {field: round(value, 4) for field, value in inputs.strengths.items()},
+    }
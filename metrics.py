@@ -0,0 +1,132 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets in seconds, the defaults of the Prometheus clients
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10)
+
+# Upper bounds of the batch and grid size buckets
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = counts, total + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    bucket = format_labels(self.labels, labels, [('le', format_value(bound))])
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(float(total))}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class CacheCounters:
+    """Hit and miss counters of functools.lru_cache caches, read from cache_info() when rendered."""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._caches = {}
+
+    def register(self, cache, cache_info):
+        self._caches[cache] = cache_info
+
+    def render(self):
+        infos = {cache: cache_info() for cache, cache_info in sorted(self._caches.items())}
+        lines = []
+        for outcome in ('hits', 'misses'):
+            name = f"{self.name}_{outcome}_total"
+            lines += [f"# HELP {name} {self.documentation.format(outcome)}", f"# TYPE {name} counter"]
+            lines += [f"{name}{format_labels(('cache',), (cache,))} {getattr(info, outcome)}" for cache, info in infos.items()]
+        return lines
+
+
+REQUESTS = Counter('shelter_requests_total', "Requests handled, per resource class, method and status code.", ('resource', 'method', 'status'))
+ERRORS = Counter('shelter_request_errors_total', "Requests answered with a 4xx or 5xx status.", ('resource', 'method', 'status'))
+LATENCY = Histogram('shelter_request_duration_seconds', "Time to build the response, up to the first chunk for streamed ones.", ('resource', 'method'))
+STAGES = Histogram('shelter_stage_duration_seconds', "Time spent in the stages of a calculation.", ('stage',))
+BATCH_SIZE = Histogram('shelter_batch_size', "Number of designs or joints per batch request.", ('resource',), SIZE_BUCKETS)
+GRID_SIZE = Histogram('shelter_grid_size', "Number of sections in the search grid of the cross section optimiser.", ('mode',), SIZE_BUCKETS)
+LRU_CACHES = CacheCounters('shelter_lru_cache', "Lookups of the in-process calculation caches that were {}, reset when they are cleared.")
+
+METRICS = (REQUESTS, ERRORS, LATENCY, STAGES, BATCH_SIZE, GRID_SIZE, LRU_CACHES)
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block into the stage histogram."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGES.observe(time.perf_counter() - start, name)
+
+
+def observe_request(resource, method, status, duration):
+    REQUESTS.inc(resource, method, str(status))
+    if status >= 400:
+        ERRORS.inc(resource, method, str(status))
+    LATENCY.observe(duration, resource, method)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format.
+
+    Metrics are kept per process: work done in the worker pools is not counted.
+    """
+
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
@@ -0,0 +1,197 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from cross_section_optimiser import CrossSectionOptimizer
+from gcode_batch import SHARED_OPTIONS, shelter_cut_list
+from generate_gcode import GCodeGanarator
+from incremental import memo_for
+from joint_1_2_4 import Joints
+from joint_3 import Joint_3
+from load_calculator import cached_calculator
+from metrics import stage
+from section_checks import LOAD_DEFAULTS
+import tasks
+
+# Threads running the stages of the pipelines, the joints and the G-code of a design run side by side
+PIPELINE_WORKERS = 3
+
+# Pool per process id, the threads of a pool do not survive the fork of a worker process
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Thread pool shared by the pipelines of this process."""
+
+    pid = os.getpid()
+    with _lock:
+        executor = _executors.get(pid)
+        if executor is None:
+            executor = _executors[pid] = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='pipeline')
+        return executor
+
+
+def footprint_inputs(footprint):
+    """Footprint with the defaults of the load calculator filled in.
+
+    The columns stand in two rows, so their number must be even and at least 4 for the beams
+    between them to have a length.
+    """
+
+    column_number = footprint.get('column_number') or 6
+    if isinstance(column_number, bool) or not isinstance(column_number, (int, float)) \
+            or column_number < 4 or column_number % 2:
+        raise ValueError(f"column_number must be an even number of at least 4, got {column_number!r}")
+
+    return footprint | {
+        'length': footprint.get('length') or 4,
+        'width': footprint.get('width') or 2,
+        'height': footprint.get('height') or 2,
+        'column_number': column_number,
+    }
+
+
+def beam_length(footprint):
+    """Length of the beams between two columns of a row."""
+
+    return footprint['length'] / ((footprint['column_number'] / 2) - 1)
+
+
+def members(result):
+    """Sizes (mm) of the shelter members derived from the beam section, as the joint endpoints take them."""
+
+    W = result['width'] * 1000
+    T = result['thickness'] * 1000
+    sizes = {
+        'beam_w': W,
+        'beam_h': T,
+        'column_w': W,
+        'column_h': T,
+        'tie_beam_w': W,
+        'tie_beam_h': (3 / 2) * T,
+        'bottom_sill_w': (5 / 4) * T,
+        'bottom_sill_h': W,
+    }
+    return {key: round(float(value), 1) for key, value in sizes.items()}
+
+
+# Every stage takes the request body and the outputs of the stages it depends on
+
+def load_stage(data, outputs):
+    # Timed as the load_calculation stage by cached_calculator
+    footprint = footprint_inputs(data.get('footprint', {}))
+    return cached_calculator(data.get('material', {}), footprint)
+
+
+def cross_section_stage(data, outputs):
+    footprint = footprint_inputs(data.get('footprint', {}))
+    load = {symbol: outputs['load_calculator'][symbol]['value'] for symbol in LOAD_DEFAULTS}
+
+    optimizer = CrossSectionOptimizer(
+        data.get('material', {}),
+        load,
+        {
+            'beam_length': beam_length(footprint),
+            'height': footprint['height'],
+        },
+        data.get('search', {}),
+        memo_for(data)
+    )
+    acceptable = [result for result in optimizer.sections() if result['final'] < 100]
+    if not acceptable:
+        raise ValueError("No acceptable cross section in the search range")
+
+    lightest = min(acceptable, key=lambda result: (result['weight'], result['width'], result['thickness']))
+    return {'section': optimizer.format_result(lightest), 'members': members(lightest)}
+
+
+def joint_1_2_4_stage(data, outputs):
+    details = Joints(footprint_inputs(data.get('footprint', {})), outputs['cross_section']['members'])
+    return details.calculate_joint_1() | details.calculate_joint_2() | details.calculate_joint_4()
+
+
+def joint_3_stage(data, outputs):
+    details = Joint_3(data.get('material', {}), outputs['cross_section']['members'], data.get('joint_search', {}))
+    with stage('joint_capacity'):
+        return details.calculate_capacity_and_status_for_graph()
+
+
+def gcode_options(data):
+    return {key: data[key] for key in SHARED_OPTIONS if key in data}
+
+
+def gcode_stage(data, outputs):
+    options = gcode_options(data)
+    joints = shelter_cut_list(footprint_inputs(data.get('footprint', {})), outputs['cross_section']['members'])
+
+    programs = {}
+    with stage('gcode_generation'):
+        for joint in joints:
+            programs[joint['name']] = GCodeGanarator().generate_gcode(**tasks.gcode_parameters(options | joint))
+    return programs
+
+
+# Stages of a full shelter design: name -> (stages it depends on, function), names are the endpoint paths
+STAGES = {
+    'load_calculator': ((), load_stage),
+    'cross_section': (('load_calculator',), cross_section_stage),
+    'joint1-2-4': (('cross_section',), joint_1_2_4_stage),
+    'joint3': (('cross_section',), joint_3_stage),
+    'generate_g_code': (('cross_section',), gcode_stage),
+}
+
+
+def selected_stages(names):
+    """The requested stages and every stage they depend on, all of them by default."""
+
+    if names is None:
+        return set(STAGES)
+    if not isinstance(names, list):
+        raise ValueError("stages must be a list of stage names")
+
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage: {name}, expected one of {', '.join(STAGES)}")
+        if name not in selected:
+            selected.add(name)
+            pending.extend(STAGES[name][0])
+    return selected
+
+
+def run_pipeline(data):
+    """Runs the stages of a shelter design as a dependency graph, in process.
+
+    A stage starts as soon as the stages it depends on are done, so independent stages run
+    concurrently on the shared thread pool. Outputs pass between stages as Python objects;
+    the first stage to fail cancels the stages not started yet and raises its error.
+    """
+
+    remaining = selected_stages(data.get('stages'))
+
+    # Invalid footprints and G-code options are refused before any stage starts
+    footprint_inputs(data.get('footprint', {}))
+    if 'generate_g_code' in remaining:
+        tasks.gcode_parameters(gcode_options(data))
+    outputs = {}
+    running = {}
+    executor = get_executor()
+
+    try:
+        while remaining or running:
+            ready = [name for name in remaining if all(dependency in outputs for dependency in STAGES[name][0])]
+            for name in ready:
+                remaining.discard(name)
+                running[executor.submit(STAGES[name][1], data, dict(outputs))] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                outputs[running.pop(future)] = future.result()
+    finally:
+        for future in running:
+            future.cancel()
+
+    return {name: outputs[name] for name in STAGES if name in outputs}
@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# One pool, sized to the CPUs, is kept for the lifetime of the server, so the workers are forked once.
+# Pools are kept per process id, a forked process must not reuse the pool of its parent.
+_pools = {}
+_lock = threading.Lock()
+
+# True in the workers of the pool, work they map is computed in line instead of on a pool of their own
+_in_worker = False
+
+
+def worker_count(workers=None):
+    """Requested number of workers, limited to the CPUs of this host."""
+
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        return cpus
+    if isinstance(workers, bool) or not isinstance(workers, int) or workers < 1:
+        raise ValueError(f"workers must be a positive integer, got {workers!r}")
+    return min(workers, cpus)
+
+
+def mark_worker():
+    global _in_worker
+    _in_worker = True
+
+
+def get_pool():
+    """Persistent process pool with one worker per CPU, shared across requests and jobs."""
+
+    pid = os.getpid()
+    with _lock:
+        pool = _pools.get(pid)
+        if pool is None:
+            pool = _pools[pid] = ProcessPoolExecutor(max_workers=worker_count(), initializer=mark_worker)
+        return pool
+
+
+def pool_map(function, items, workers=None):
+    """Yields function(item) for every item, in order, computed on the shared pool.
+
+    At most workers items (by default one per CPU) are submitted at a time, so a request
+    limits its share of the pool without a pool of its own. Items not yet started are
+    cancelled when the generator is closed early. On a worker of the pool, e.g. in a job, the
+    items are computed in line.
+    """
+
+    limit = worker_count(workers)
+    if _in_worker:
+        yield from map(function, items)
+        return
+
+    pool = get_pool()
+    pending = deque()
+    try:
+        for item in items:
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+            pending.append(pool.submit(function, item))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def shutdown_pool():
+    with _lock:
+        pool = _pools.pop(os.getpid(), None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
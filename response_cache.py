@@ -0,0 +1,170 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Endpoints whose responses are cached, all are pure functions of the request body.
+# design_verify is off: its bodies are large and rarely repeated.
+CACHED_ENDPOINTS = {
+    'cross_section': True,
+    'cross_section/sweep': True,
+    'load_calculator': True,
+    'joint1-2-4': True,
+    'joint3': True,
+    'design_verify': False,
+    'generate_g_code': True,
+    'pipeline': True,
+}
+
+# Bounds of the cache, the least recently used responses are evicted first
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Seconds a cached response is served for
+CACHE_TTL = 300
+
+
+def normalize(value):
+    """Request body with numbers normalized, so 2 and 2.0 give the same key."""
+
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def cache_key(endpoint, data):
+    """Hash of the endpoint and the canonical JSON of the request body."""
+
+    canonical = json.dumps(normalize(data), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{endpoint}\n{canonical}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """Least recently used cache of response bodies, bounded in entries, bytes and age."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._evictions = 0
+
+    def _count(self, endpoint, outcome):
+        counts = self._counts.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        counts[outcome] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry['body'])
+
+    def get(self, endpoint, key):
+        """Cached entry of the key, None when it is missing or expired."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] < time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self._count(endpoint, 'misses')
+                return None
+
+            self._entries.move_to_end(key)
+            self._count(endpoint, 'hits')
+            return entry
+
+    def put(self, key, body, mimetype, status):
+        if len(body) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            now = time.monotonic()
+            self._entries[key] = {
+                'body': body,
+                'mimetype': mimetype,
+                'status': status,
+                'stored': now,
+                'expires': now + self.ttl,
+            }
+            self._size += len(body)
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            hits = sum(counts['hits'] for counts in self._counts.values())
+            misses = sum(counts['misses'] for counts in self._counts.values())
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+                'evictions': self._evictions,
+                'endpoints': {
+                    endpoint: counts | {
+                        'hit_rate': round(counts['hits'] / (counts['hits'] + counts['misses']), 4)
+                    }
+                    for endpoint, counts in self._counts.items()
+                },
+            }
+
+
+def cached(cache, endpoint):
+    """Serves a resource method from the cache when its endpoint is enabled in CACHED_ENDPOINTS.
+
+    Only complete, successful responses are stored; streamed ones and errors are passed
+    through. The X-Cache header tells whether a response was a HIT or a MISS.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if not CACHED_ENDPOINTS.get(endpoint) or not data:
+                return method(*args, **kwargs)
+
+            key = cache_key(endpoint, data)
+            entry = cache.get(endpoint, key)
+            if entry is not None:
+                response = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+                response.headers['X-Cache'] = 'HIT'
+                response.headers['Age'] = str(int(time.monotonic() - entry['stored']))
+                return response
+
+            response = method(*args, **kwargs)
+            if isinstance(response, Response):
+                if response.status_code == 200 and not response.is_streamed:
+                    cache.put(key, response.get_data(), response.mimetype, response.status_code)
+                response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,262 @@
+import numpy as np
+
+# Defaults shared by the cross-section optimizer and the verifier
+MATERIAL_DEFAULTS = {
+    'y_m': ('partial_factor', 1.3),                                 # Partial factor
+    'rho': ('density', 610),                                        # Density
+    'fm_k': ('bending_strength', 91),                               # Bending strength
+    'fv_k': ('shear_strength', 9),                                  # Shear strength
+    'fc_k': ('compression_parallel', 45),                           # Compression parallel strength
+    'E': ('e_modulus', 11.2),                                       # E-modulus
+    'E_0_G_05': ('e_modulus_5', 11.2),                              # E-modulus_5
+    'kmod_p': ('modification_factor_permanent_term', 0.5),          # Modification factor permanent term
+    'kmod_m': ('modification_factor_medium_term', 0.65),            # Modification factor medium term
+    'kmod_i': ('modification_factor_instantaneous_term', 0.9),      # Modification factor instantaneous term
+    'K_def': ('creep_factor', 2),                                   # Creep factor
+    'B_c': ('creep_factor_solid_timber', 0.2),                      # Factor for solid timber
+}
+
+# Calculated by load calculator
+LOAD_DEFAULTS = {
+    'P_L': 2.96,
+    'M_L': 7.44,
+    'I_L': 5.66,
+    'SLS_L': 5.18,
+    'gk': 1.38,
+    'g_lead': 2,
+    'g_acmp': 1.4,
+    'psi_lead': 0,
+    'psi_acmp': 0.2,
+    'P_clm': 3.7,
+    'M_clm': 9.2,
+    'I_clm': 7,
+}
+
+# Order of the utilisation checks as they appear in the results
+CHECKS = ('bending', 'shear', 'sls', 'compression', 'buckling_y', 'buckling_z')
+
+# Relative cost of each check on a batch of designs, compression being the cheapest
+CHECK_COSTS = {
+    'bending': 3,
+    'shear': 2,
+    'sls': 6,
+    'compression': 1,
+    'buckling_y': 3,
+    'buckling_z': 3,
+}
+
+# Order of a short-circuit verification before any rejections are recorded: the checks that
+# reject the most designs per unit of cost first (SLS deflection governs most beams)
+CHECK_ORDER = ('sls', 'bending', 'shear', 'buckling_z', 'buckling_y', 'compression')
+
+# Check evaluations recorded before the order adapts, and between two updates of the order
+ADAPT_AFTER = 1000
+
+
+def material_inputs(material):
+    """Reads the material attributes of a request, falling back to the defaults."""
+
+    return {symbol: material.get(key) or default for symbol, (key, default) in MATERIAL_DEFAULTS.items()}
+
+
+def load_inputs(load):
+    """Reads the load attributes of a request, falling back to the defaults."""
+
+    return {symbol: load.get(symbol) or default for symbol, default in LOAD_DEFAULTS.items()}
+
+
+def design_strengths(m):
+    """Derived design strength values for the permanent, medium and instantaneous terms.
+
+    Inputs of a library class carry them precomputed (see materials.LibraryInputs).
+    """
+
+    strengths = getattr(m, 'strengths', None)
+    if strengths is not None:
+        return strengths
+
+    return {
+        'fm_d_p': (m['kmod_p'] * m['fm_k']) / m['y_m'],
+        'fm_d_m': (m['kmod_m'] * m['fm_k']) / m['y_m'],
+        'fm_d_i': (m['kmod_i'] * m['fm_k']) / m['y_m'],
+
+        'fv_d_p': (m['kmod_p'] * m['fv_k']) / m['y_m'],
+        'fv_d_m': (m['kmod_m'] * m['fv_k']) / m['y_m'],
+        'fv_d_i': (m['kmod_i'] * m['fv_k']) / m['y_m'],
+
+        'fc_d_p': (m['kmod_p'] * m['fc_k']) / m['y_m'],
+        'fc_d_m': (m['kmod_m'] * m['fc_k']) / m['y_m'],
+        'fc_d_i': (m['kmod_i'] * m['fc_k']) / m['y_m'],
+    }
+
+
+# Every check below takes W and T in metres as scalars or NumPy arrays and broadcasts
+# them against each other and against L, L_clm and the material/load values.
+
+def bending_utilisation(W, T, L, m, ld, fd):
+    I_y = (W * 1000) * ((T * 1000)**3) / 12  # Moment of inertia with correct units
+
+    # ULS Calculations for beam
+    Md_1 = ld['P_L'] * L**2 / 8
+    Md_2 = ld['M_L'] * L**2 / 8
+    Md_3 = ld['I_L'] * L**2 / 8
+
+    h = T  # Total depth of the beam
+
+    return np.maximum(np.maximum((Md_1 / I_y) * (h * 1000 / 2) * (10**6) / fd['fm_d_p'],
+                                 (Md_2 / I_y) * (h * 1000 / 2) * (10**6) / fd['fm_d_m']),
+                      (Md_3 / I_y) * (h * 1000 / 2) * (10**6) / fd['fm_d_i']) * 100
+
+
+def shear_utilisation(W, T, L, m, ld, fd):
+    h = T  # Total depth of the beam
+
+    # Shear stresses for ULS beam
+    tau_1 = 3/2 * (ld['P_L'] * L / 2) / (W * h) / 1000
+    tau_2 = 3/2 * (ld['M_L'] * L / 2) / (W * h) / 1000
+    tau_3 = 3/2 * (ld['I_L'] * L / 2) / (W * h) / 1000
+
+    return np.maximum(np.maximum(tau_1 / fd['fv_d_p'], tau_2 / fd['fv_d_m']), tau_3 / fd['fv_d_i']) * 100
+
+
+def sls_utilisation(W, T, L, m, ld, fd):
+    I_y = (W * 1000) * ((T * 1000)**3) / 12  # Moment of inertia with correct units
+
+    # SLS Calculations for deflection
+    δ_inst = 5*(1e6) *(ld['SLS_L'] * L**4) / (384 * m['E'] * I_y)
+    δ_crp_g = 5*(1e6) *(ld['gk'] * L**4) * m['K_def'] / (384 * m['E'] * I_y)
+    δ_crp_lead = 5*(1e6) *(ld['g_lead'] * L**4) * m['K_def'] * ld['psi_lead'] / (384 * m['E'] * I_y)
+    δ_crp_acmp = 5*(1e6) *(ld['g_acmp'] * L**4) * m['K_def'] * ld['psi_acmp'] / (384 * m['E'] * I_y)
+    δ_fin = δ_inst + δ_crp_g + δ_crp_lead + δ_crp_acmp
+
+    util_deflct_inst = δ_inst / (L / 300) * 100
+    util_deflct_fin = δ_fin / (L / 150) * 100
+    return np.maximum(util_deflct_inst, util_deflct_fin)
+
+
+def compression_utilisation(W, T, L_clm, m, ld, fd):
+    # ULS Calculations for Column Compression
+    Strs_c_1 = ld['P_clm'] / ((W * T)*(1e3))
+    Strs_c_2 = ld['M_clm'] / ((W * T)*(1e3))
+    Strs_c_3 = ld['I_clm'] / ((W * T)*(1e3))
+
+    return np.maximum(np.maximum(Strs_c_1 / fd['fc_d_p'], Strs_c_2 / fd['fc_d_m']), Strs_c_3 / fd['fc_d_i']) * 100
+
+
+def buckling_utilisation(W, T, L_clm, m, ld, fd, axis):
+    # axis 'y' is in plane, axis 'z' is out of plane
+    if axis == 'y':
+        I = (W * 1000) * ((T * 1000)**3) / 12  # Moment of inertia with correct units
+    else:
+        I = (T * 1000) * ((W * 1000)**3) / 12
+
+    Strs_c_1 = ld['P_clm'] / ((W * T)*(1e3))
+
+    # ULS Calculations for Column Buckling
+    L_b = L_clm     # Buckling length
+
+    i = (I / (W * T* (1e12)))**(1/2)  # Radius of inertia
+    sln_rtio = L_b / i                # Slenderness ratio
+    sln_rel = (((sln_rtio/ np.pi)) * (((m['fc_k']/ m['E_0_G_05'] )*(10))**(1/2)))/100   # Relative slenderness ratio
+
+    k = 0.5 * (1 + m['B_c'] * (sln_rel - 0.3) + (sln_rel **2))   # Instability factor
+    k_c = 1 / (k + np.sqrt((k**2) - (sln_rel **2)))               # Buckling reduction coefficient
+
+    return (Strs_c_1/ ((k_c) * (fd['fc_d_m']))) * 100
+
+
+def evaluate_check(check, W, T, L, L_clm, m, ld, fd):
+    """Utilisation (%) of a single check, see CHECKS."""
+
+    if check == 'bending':
+        return bending_utilisation(W, T, L, m, ld, fd)
+    if check == 'shear':
+        return shear_utilisation(W, T, L, m, ld, fd)
+    if check == 'sls':
+        return sls_utilisation(W, T, L, m, ld, fd)
+    if check == 'compression':
+        return compression_utilisation(W, T, L_clm, m, ld, fd)
+    if check == 'buckling_y':
+        return buckling_utilisation(W, T, L_clm, m, ld, fd, 'y')
+    if check == 'buckling_z':
+        return buckling_utilisation(W, T, L_clm, m, ld, fd, 'z')
+    raise ValueError(f"Unknown check: {check}")
+
+
+def evaluate_sections(W, T, L, L_clm, m, ld, fd=None, memo=None):
+    """Evaluates every utilisation check for all (W, T) combinations in one broadcast pass.
+
+    Returns the weight and the utilisation (%) of each check as arrays with the broadcast shape.
+    With a memo (see incremental.CheckMemo) a check whose inputs did not change is not evaluated
+    again, its arrays are then read-only.
+    """
+
+    if fd is None:
+        fd = design_strengths(m)
+
+    W, T = np.asarray(W, dtype=float), np.asarray(T, dtype=float)
+
+    result = {'weight': m['rho'] * (L * W * T)}
+    if memo is not None:
+        # Sizes are fingerprinted before broadcasting, every check broadcasts W against T
+        for check in CHECKS:
+            result[check] = memo.evaluate(check, evaluate_check, W, T, L, L_clm, m, ld, fd)
+    else:
+        W, T = np.broadcast_arrays(W, T)
+        for check in CHECKS:
+            result[check] = evaluate_check(check, W, T, L, L_clm, m, ld, fd)
+
+    util_final = result['bending']
+    for check in CHECKS[1:]:
+        util_final = np.maximum(util_final, result[check])
+    result['final'] = util_final
+
+    return result
+
+
+class CheckStatistics:
+    """Counts how often each check rejects the designs it is evaluated on.
+
+    order() runs the check with the highest rejection rate per unit of cost first, so a
+    short-circuit verification reaches a failing check as early as possible. The counts are
+    not locked: concurrent requests may lose an increment, which only affects the order.
+    """
+
+    def __init__(self, default=CHECK_ORDER, adapt_after=ADAPT_AFTER):
+        self.default = tuple(default)
+        self.adapt_after = adapt_after
+        self.evaluated = dict.fromkeys(CHECKS, 0)
+        self.rejected = dict.fromkeys(CHECKS, 0)
+        self._order = self.default
+        self._next_update = adapt_after
+
+    def record(self, check, evaluated, rejected):
+        self.evaluated[check] += evaluated
+        self.rejected[check] += rejected
+
+    def rejection_rate(self, check):
+        # Smoothed, so a check that was never evaluated is not ranked on no data
+        return (self.rejected[check] + 1) / (self.evaluated[check] + 2)
+
+    def order(self):
+        total = sum(self.evaluated.values())
+        if total >= self._next_update:
+            self._next_update = total + self.adapt_after
+            self._order = tuple(sorted(
+                CHECKS,
+                key=lambda check: (-self.rejection_rate(check) / CHECK_COSTS[check], self.default.index(check))
+            ))
+        return self._order
+
+    def stats(self):
+        return {
+            'order': list(self.order()),
+            'checks': {
+                check: {
+                    'evaluated': self.evaluated[check],
+                    'rejected': self.rejected[check],
+                    'rejection_rate': round(self.rejected[check] / self.evaluated[check], 4) if self.evaluated[check] else None,
+                }
+                for check in CHECKS
+            },
+        }
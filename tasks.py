@@ -0,0 +1,162 @@
+from cross_section_optimiser import CrossSectionOptimizer
+from load_calculator import LoadCaluculator
+from joint_3 import Joint_3
+from joint_1_2_4 import Joints
+from generate_gcode import MIN_STEP_DOWN, MIN_STEPOVER_RATIO, GCodeGanarator, estimate_cycle_time
+from verifier import PARALLEL_CHUNK_SIZE, verify_batch, verify_parallel
+from formats import compact, is_compact
+from metrics import stage
+from incremental import memo_for
+
+# The calculations behind every endpoint, as plain functions of the request body.
+# They only depend on the calculation modules, so they can also run in worker processes.
+# With a compact response format requested, the results are returned as columns, with
+# "incremental": true the checks are memoized by the fingerprint of their inputs.
+
+def cross_section(data):
+    optimizer = CrossSectionOptimizer(
+        data.get('material', {}),
+        data.get('load', {}),
+        data.get('footprint', {}),
+        data.get('search', {}),
+        memo_for(data)
+    )
+    if is_compact(data):
+        return optimizer.columns()
+    return optimizer.optimizer()
+
+def cross_section_sweep(data):
+    optimizer = CrossSectionOptimizer(
+        data.get('material', {}),
+        data.get('load', {}),
+        data.get('footprint', {}),
+        data.get('search', {}),
+        memo_for(data)
+    )
+    return optimizer.sweep(data.get('sweep'))
+
+def load_calculator(data):
+    calculator = LoadCaluculator(
+        data.get('material', {}),
+        data.get('footprint', {})
+    )
+    with stage('load_calculation'):
+        results = calculator.calculator()
+    return compact(results) if is_compact(data) else results
+
+def joint_1_2_4(data):
+    details = Joints(
+        data.get('footprint', {}),
+        data.get('cross_section', {})
+    )
+    results = details.calculate_joint_1() | details.calculate_joint_2() | details.calculate_joint_4()
+    return compact(results) if is_compact(data) else results
+
+def joint_3(data):
+    details = Joint_3(
+        data.get('material', {}),
+        data.get('cross_section', {}),
+        data.get('search', {})
+    )
+    with stage('joint_capacity'):
+        results = details.calculate_capacity_and_status_for_graph()
+    return compact(results) if is_compact(data) else results
+
+def design_verify(data):
+    designs = data.get('designs') or []
+    governing = bool(data.get('governing'))
+
+    # Opt-in sharding over worker processes: true or {workers, chunk_size}
+    parallel = data.get('parallel')
+    with stage('verification'):
+        if parallel:
+            settings = parallel if isinstance(parallel, dict) else {}
+            mask, checks = verify_parallel(
+                designs,
+                workers=settings.get('workers'),
+                chunk_size=settings.get('chunk_size') or PARALLEL_CHUNK_SIZE,
+                governing=governing,
+                incremental=bool(data.get('incremental'))
+            )
+        else:
+            mask, checks = verify_batch(designs, governing, bool(data.get('incremental')))
+
+    results = {'acceptable_designs': [design for design, is_acceptable in zip(designs, mask) if is_acceptable]}
+
+    # Opt-in: the check that governed every design, in the order of the designs
+    if governing:
+        results['governing_checks'] = checks
+    return results
+
+def gcode_parameters(data):
+    tie_beam_w = data.get('tie_beam_w', 20)
+    tie_beam_h = data.get('tie_beam_h', 40)
+    column_h = data.get('column_h', 10)
+
+    step_down = data.get('step_down') or 2
+    if isinstance(step_down, bool) or not isinstance(step_down, (int, float)) or step_down < MIN_STEP_DOWN:
+        raise ValueError(f"step_down must be a number of at least {MIN_STEP_DOWN} mm, got {step_down!r}")
+
+    # Between a twentieth of the tool diameter and the full diameter, so the rows overlap and stay few
+    tool_diameter = 8
+    stepover = data.get('stepover')
+    if stepover is not None and (
+        isinstance(stepover, bool) or not isinstance(stepover, (int, float))
+        or not MIN_STEPOVER_RATIO * tool_diameter <= stepover <= tool_diameter
+    ):
+        raise ValueError(
+            f"stepover must be between {MIN_STEPOVER_RATIO * tool_diameter} and {tool_diameter} mm "
+            f"(the tool diameter), got {stepover!r}"
+        )
+
+    return dict(
+        mortise_width=tie_beam_w,                 # tie_beam Width
+        mortise_height=tie_beam_h,                # tie_beam Height
+        mortise_depth=column_h,                   # Coulmn Height
+        tenon_width=(1/3) * tie_beam_w,           # (1/3) tie_beam Width
+        tenon_height=tie_beam_h,                  # tie_beam Height
+        tenon_length=column_h,                    # Coulmn Height
+        peg_diameter=1,
+        peg_depth=20,
+        tool_diameter=tool_diameter,
+        feed_rate=1000,
+        spindle_speed=10000,
+        safe_z=10,
+        step_down=step_down,
+        optimized=bool(data.get('optimized')),
+        stepover=stepover,
+    )
+
+def gcode_program(data):
+    gcode_generator = GCodeGanarator()
+    with stage('gcode_generation'):
+        return gcode_generator.generate_gcode(**gcode_parameters(data))
+
+def generate_g_code(data):
+    program = gcode_program(data)
+
+    # Opt-in: the program with its estimated machining time, to compare toolpaths
+    if data.get('cycle_time'):
+        feed_rate = gcode_parameters(data)['feed_rate']
+        return {
+            'gcode': program,
+            'cycle_time_s': round(estimate_cycle_time(program.splitlines(), feed_rate), 1),
+        }
+    return program
+
+def pipeline(data):
+    # Imported here, the pipeline builds on gcode_batch and this module
+    from pipeline import run_pipeline
+    return run_pipeline(data)
+
+# Task names are the endpoint paths
+TASKS = {
+    'cross_section': cross_section,
+    'cross_section/sweep': cross_section_sweep,
+    'load_calculator': load_calculator,
+    'joint1-2-4': joint_1_2_4,
+    'joint3': joint_3,
+    'design_verify': design_verify,
+    'generate_g_code': generate_g_code,
+    'pipeline': pipeline,
+}
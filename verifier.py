@@ -1,9 +1,53 @@
-import math as mt
-from load_calculator import LoadCaluculator
+from functools import partial
+import numpy as np
+from load_calculator import load_key, cached_calculator
+from incremental import check_memo
+from materials import resolve_inputs
+from section_checks import (
+    CHECKS, MATERIAL_DEFAULTS, LOAD_DEFAULTS, CheckStatistics, design_strengths,
+    evaluate_check, evaluate_sections
+)
+from process_pool import pool_map
+from cross_section_optimiser import is_number
+
+# Number of designs verified per batch when streaming results
+STREAM_CHUNK_SIZE = 64
+
+# Number of designs sent to a worker process at a time when verifying in parallel
+PARALLEL_CHUNK_SIZE = 2000
+
+# Smaller batches are checked in one full pass, below this size indexing the designs that
+# survive each check costs more than the checks it skips
+SHORT_CIRCUIT_MIN_BATCH = 5000
+
+# Rejections seen by the short-circuit verifications of this process, they order the checks
+check_statistics = CheckStatistics()
+
+def check_design(design):
+    """Raises ValueError when a design lacks the cross section or footprint the verification needs."""
+
+    if not isinstance(design, dict) or not isinstance(design.get('cross_section'), dict):
+        raise ValueError("Every design needs a cross_section object")
+
+    footprint = design.get('footprint')
+    if not isinstance(footprint, dict) or not is_number(footprint.get('length')):
+        raise ValueError("Every design needs a footprint with a numeric length")
+    if not is_number(footprint.get('column_number')) or footprint['column_number'] <= 2:
+        raise ValueError("The column_number of every footprint must be a number greater than 2")
+
+
+def validate_designs(designs):
+    """Checks every design and resolves its material up front, raising ValueError on the first invalid one."""
+
+    if not isinstance(designs, list):
+        raise ValueError("designs must be a list")
+    for design in designs:
+        check_design(design)
+        resolve_inputs(design.get('material'))
+
 
 class Verifier:
     def __init__(self, material, cross_section, footprint):
-        self.material = material
         self.cross_section = cross_section
         self.footprint = footprint
 
@@ -16,23 +60,14 @@ class Verifier:
         self.L = length / ((column_number / 2) - 1)                              # BEAM_LENGTH 
         self.L_clm = self.footprint.get('height')                                # Column_LENGTH
         
-        self.y_m = self.material.get('partial_factor') or 1.3                              # Partial factor   
-        self.rho = self.material.get('density') or 610
-        self.fm_k = self.material.get('bending_strength') or 91                            # Bending strength
-        self.fv_k = self.material.get('shear_strength') or 9                               # Shear strength
-        self.fc_k = self.material.get('compression_parallel') or 45                        # Compression prallel strength
-        self.E = self.material.get('e_modulus') or 11.2                                    # E-modulus
-        self.E_0_G_05 = self.material.get('e_modulus_5') or 11.2                           # E-modulus_5
-        self.kmod_p = self.material.get('modification_factor_permanent_term') or 0.5       # Modification_factor_permenant_term
-        self.kmod_m = self.material.get('modification_factor_medium_term') or 0.65         # Modification_factor_medium_term
-        self.kmod_i = self.material.get('modification_factor_instantaneous_term') or 0.9   # Modification_factor_instantaneous_term
-        self.K_def = self.material.get('creep_factor') or 2                                # Creep factor
-        self.B_c = self.material.get('creep_factor_solid_timber') or  0.2                  # Factor for solid timber
+        # Material inputs and design strengths, see section_checks.MATERIAL_DEFAULTS
+        self.m = resolve_inputs(material)
+        self.fd = design_strengths(self.m)
 
         # These_values_are_calculated_by_load_calculator
-        load_calculation = LoadCaluculator(
+        load_calculation = cached_calculator(
            {
-               'density': self.rho
+               'density': self.m['rho']
            },{
                 'slab_thickness': self.footprint.get('slab_thickness'),
                 'width': self.footprint.get('width'),
@@ -40,100 +75,234 @@ class Verifier:
                 'height': self.L_clm,
                 'column_number': column_number
            }
-        ).calculator()
-        self.P_L = load_calculation.get('P_L').get('value') or 2.96                       
-        self.M_L = load_calculation.get('M_L').get('value') or 7.44
-        self.I_L = load_calculation.get('I_L').get('value') or 5.66
-        self.SLS_L = load_calculation.get('SLS_L').get('value') or 5.18
-        self.gk = load_calculation.get('gk').get('value') or 1.38
-        self.g_lead = load_calculation.get('g_lead').get('value') or 2
-        self.g_acmp = load_calculation.get('g_acmp').get('value') or 1.4
-        self.psi_lead = load_calculation.get('psi_lead').get('value') or 0
-        self.psi_acmp = load_calculation.get('psi_acmp').get('value') or 0.2
-        self.P_clm = load_calculation.get('P_clm').get('value') or 3.7
-        self.M_clm = load_calculation.get('M_clm').get('value') or 9.2
-        self.I_clm = load_calculation.get('I_clm').get('value') or 7
+        )
+        self.ld = {
+            symbol: load_calculation.get(symbol).get('value') or default for symbol, default in LOAD_DEFAULTS.items()
+        }
 
 
     def verify_every_design(self):
-        # Derived design strength values
-        fm_d_p = (self.kmod_p * self.fm_k) / self.y_m
-        fm_d_m = (self.kmod_m * self.fm_k) / self.y_m
-        fm_d_i = (self.kmod_i * self.fm_k) / self.y_m
-        
-        fv_d_p = (self.kmod_p * self.fv_k) / self.y_m
-        fv_d_m = (self.kmod_m * self.fv_k) / self.y_m
-        fv_d_i = (self.kmod_i * self.fv_k) / self.y_m
-
-        fc_d_p = (self.kmod_p * self.fc_k) / self.y_m
-        fc_d_m = (self.kmod_m * self.fc_k) / self.y_m
-        fc_d_i = (self.kmod_i * self.fc_k) / self.y_m
-
-        # Volume and weight
-        V = self.L * self.W * self.T
-        Wt = self.rho * V
-        I_y = (self.W * 1000) * ((self.T * 1000)**3) / 12  # Moment of inertia with correct units
-        I_z = (self.T * 1000) * ((self.W * 1000)**3) / 12  # Moment of inertia with correct units
-
-        # ULS Calculations for beam
-        Md_1 = self.P_L * self.L**2 / 8
-        Md_2 = self.M_L * self.L**2 / 8
-        Md_3 = self.I_L * self.L**2 / 8
-
-        h = self.T  # Total depth of the beam
-
-        # Shear and Bending stresses for ULS beam
-        tau_1 = 3/2 * (self.P_L * self.L / 2) / (self.W * h) / 1000
-        tau_2 = 3/2 * (self.M_L * self.L / 2) / (self.W * h) / 1000
-        tau_3 = 3/2 * (self.I_L * self.L / 2) / (self.W * h) / 1000
-
-        util_bend = max((Md_1 / I_y) * (h * 1000 / 2) * (10**6) / fm_d_p,
-                        (Md_2 / I_y) * (h * 1000 / 2) * (10**6) / fm_d_m,
-                        (Md_3 / I_y) * (h * 1000 / 2) * (10**6) / fm_d_i) * 100
-        util_shear = max(tau_1 / fv_d_p, tau_2 / fv_d_m, tau_3 / fv_d_i) * 100
-
-        # SLS Calculations for deflection
-        δ_inst = 5*(1e6)*(self.SLS_L * self.L**4) / (384 * self.E * I_y)
-        δ_crp_g = 5*(1e6)*(self.gk * self.L**4) * self.K_def / (384 * self.E * I_y)
-        δ_crp_lead = 5*(1e6)*(self.g_lead * self.L**4) * self.K_def * self.psi_lead / (384 * self.E * I_y)
-        δ_crp_acmp = 5*(1e6)*(self.g_acmp * self.L**4) * self.K_def * self.psi_acmp / (384 * self.E * I_y)
-        δ_fin = δ_inst + δ_crp_g + δ_crp_lead + δ_crp_acmp
-
-        util_deflct_inst = δ_inst / (self.L / 300) * 100
-        util_deflct_fin = δ_fin / (self.L / 150) * 100
-        util_sls = max(util_deflct_inst, util_deflct_fin)
-
-        # ULS Calculations for Column Compression
-        Strs_c_1 = self.P_clm / ((self.W * self.T)*(1e3))
-        Strs_c_2 = self.M_clm / ((self.W * self.T)*(1e3))
-        Strs_c_3 = self.I_clm / ((self.W * self.T)*(1e3))
-
-        util_cmprs = max(Strs_c_1 / fc_d_p , Strs_c_2 / fc_d_m , Strs_c_3 / fc_d_i ) * 100
-
-        # ULS Calculations for Column Buckling
-        L_y = self.L_clm     # Buckling lengths
-        L_Z = self.L_clm 
-                
-        i_y = (I_y / (self.W * self.T* (1e12)))**(1/2) # Radius of inertia
-        i_z = (I_z / (self.W * self.T* (1e12)))**(1/2)
-                
-        sln_rtio_y = L_y / i_y        # Slenderness ratio
-        sln_rtio_z = L_Z / i_z 
-                
-        sln_rel_y = (((sln_rtio_y/ mt.pi)) * (((self.fc_k/ self.E_0_G_05 )*(10))**(1/2)))/100   # Relative slenderness ratio
-        sln_rel_z = (((sln_rtio_z/ mt.pi)) * (((self.fc_k/ self.E_0_G_05 )*(10))**(1/2)))/100  
-
-        k_y = 0.5 * (1 + self.B_c * (sln_rel_y - 0.3) + (sln_rel_y **2))   # Instability factor 
-        k_z = 0.5 * (1 + self.B_c * (sln_rel_z - 0.3) + (sln_rel_z **2))
-
-        k_c_y = 1 / (k_y + mt.sqrt((k_y**2) - (sln_rel_y **2)))      # Buckling reduction coefficient 
-        k_c_z = 1 / (k_z + mt.sqrt((k_z**2) - (sln_rel_z **2)))
-
-        util_buckl_y = (Strs_c_1/ ((k_c_y) * (fc_d_m))) * 100   # Utilization in plane
-        util_buckl_z = (Strs_c_1/ ((k_c_z) * (fc_d_m) )) * 100  # Utilization out of plane
-
-        # Final status check
-        util_final = max(util_bend, util_shear, util_sls, util_cmprs, util_buckl_y, util_buckl_z)
-        final_status = "Acceptable" if util_final < 100 else "Unacceptable"
-
-        return final_status == "Acceptable"
+        """Short-circuit verification: the checks run in order (by default the adaptive order of
+        check_statistics) and stop at the first utilisation of 100% or more.
+        """
+
+        for check in check_statistics.order():
+            utilisation = self.utilisation(check)
+            # NaN utilisations (missing inputs) are rejected, as by the full pass
+            rejected = not utilisation < 100
+            check_statistics.record(check, 1, int(rejected))
+            if rejected:
+                return False
+
+        return True
+
+    def verify(self):
+        """(acceptable, governing check), the governing check being the most utilised one.
+
+        Every check runs, so the governing check does not depend on the order of the checks.
+        """
+
+        utilisations = [self.utilisation(check) for check in CHECKS]
+        acceptable = all(utilisation < 100 for utilisation in utilisations)
+        return acceptable, CHECKS[int(np.argmax(utilisations))]
+
+    def utilisation(self, check):
+        """Utilisation (%) of a single check of the design, see section_checks.evaluate_check()."""
+
+        return float(evaluate_check(check, self.W, self.T, self.L, self.L_clm, self.m, self.ld, self.fd))
+
+
+class BatchVerifier:
+    """Verifies a whole batch of designs at once.
+
+    The designs are loaded into columnar NumPy arrays (W, T, L, L_clm, material constants and
+    load values) so every check runs as one vectorized pass over the batch. With a memo (see
+    incremental.CheckMemo) the batch is always verified in full passes, so the checks whose
+    inputs did not change since an earlier request are served from the memo.
+    """
+
+    def __init__(self, designs, memo=None):
+        self.designs = designs
+        self.memo = memo
+
+        W, T, L, L_clm = [], [], [], []
+        materials = {symbol: [] for symbol in MATERIAL_DEFAULTS}
+        loads = {symbol: [] for symbol in LOAD_DEFAULTS}
+
+        # Designs sharing a footprint and density share one load calculation
+        load_values = {}
+
+        for design in self.designs:
+            check_design(design)
+            material = resolve_inputs(design.get('material'))
+            cross_section = design.get('cross_section')
+            footprint = design.get('footprint')
+
+            length = footprint.get('length')
+            column_number = footprint.get('column_number')
+
+            W.append(cross_section.get('beam_w') or 100 / 1000)                 # W= Width beam
+            T.append(cross_section.get('beam_h') or 150 / 1000)                 # T= Height beam
+            L.append(length / ((column_number / 2) - 1))                        # BEAM_LENGTH
+            L_clm.append(footprint.get('height'))                               # Column_LENGTH
+
+            for symbol, value in material.items():
+                materials[symbol].append(value)
+
+            # These_values_are_calculated_by_load_calculator
+            load_material = {
+                'density': material['rho']
+            }
+            load_footprint = {
+                'slab_thickness': footprint.get('slab_thickness'),
+                'width': footprint.get('width'),
+                'length': length,
+                'height': footprint.get('height'),
+                'column_number': column_number
+            }
+            key = load_key(load_material, load_footprint)
+            if key not in load_values:
+                load_calculation = cached_calculator(load_material, load_footprint)
+                load_values[key] = {
+                    symbol: load_calculation.get(symbol).get('value') or default for symbol, default in LOAD_DEFAULTS.items()
+                }
+            for symbol, value in load_values[key].items():
+                loads[symbol].append(value)
+
+        self.W = np.array(W, dtype=float)
+        self.T = np.array(T, dtype=float)
+        self.L = np.array(L, dtype=float)
+        self.L_clm = np.array(L_clm, dtype=float)
+        self.m = {symbol: np.array(values, dtype=float) for symbol, values in materials.items()}
+        self.ld = {symbol: np.array(values, dtype=float) for symbol, values in loads.items()}
+
+    def utilisations(self):
+        return evaluate_sections(self.W, self.T, self.L, self.L_clm, self.m, self.ld, memo=self.memo)
+
+    def acceptable_mask(self):
+        """Boolean array, True for every design whose final utilisation is below 100%."""
+
+        if len(self.W) < SHORT_CIRCUIT_MIN_BATCH or self.memo is not None:
+            return self.utilisations()['final'] < 100
+        return self.short_circuit()
+
+    def verify(self):
+        """(acceptable mask, governing check of every design), the governing check being the most utilised one.
+
+        Every check runs on every design, so the governing checks do not depend on the order of
+        the checks; only acceptable_mask() short-circuits.
+        """
+
+        utilisations = self.utilisations()
+        return utilisations['final'] < 100, self.governing_checks(utilisations)
+
+    def short_circuit(self, order=None):
+        """Acceptable mask of the batch, the checks stopping at the first rejection of every design.
+
+        The checks run in order (by default the adaptive order of check_statistics), each one
+        only on the designs no earlier check rejected.
+        """
+
+        fd = design_strengths(self.m)
+
+        acceptable = np.ones(len(self.W), dtype=bool)
+
+        active = np.arange(len(self.W))
+        for check in order or check_statistics.order():
+            if active.size == 0:
+                break
+
+            if active.size == len(self.W):
+                utilisation = evaluate_check(check, self.W, self.T, self.L, self.L_clm, self.m, self.ld, fd)
+            else:
+                utilisation = evaluate_check(
+                    check, self.W[active], self.T[active], self.L[active], self.L_clm[active],
+                    _Subset(self.m, active), _Subset(self.ld, active), _Subset(fd, active)
+                )
+            # NaN utilisations (missing inputs) are rejected, as by the full pass
+            rejected = ~(utilisation < 100)
+            check_statistics.record(check, active.size, int(rejected.sum()))
+
+            acceptable[active[rejected]] = False
+            active = active[~rejected]
+
+        return acceptable
+
+    def acceptable_designs(self):
+        return [design for design, is_acceptable in zip(self.designs, self.acceptable_mask()) if is_acceptable]
+
+    def governing_checks(self, utilisations=None):
+        """Name of the check with the highest utilisation of every design."""
+
+        if utilisations is None:
+            utilisations = self.utilisations()
+
+        governing = np.argmax(np.stack([utilisations[check] for check in CHECKS]), axis=0)
+        return [CHECKS[index] for index in governing]
+
+
+class _Subset:
+    """Values of some designs of a batch, every array is indexed when a check first reads it."""
+
+    def __init__(self, values, index):
+        self.values = values
+        self.index = index
+        self.cache = {}
+
+    def __getitem__(self, symbol):
+        if symbol not in self.cache:
+            self.cache[symbol] = self.values[symbol][self.index]
+        return self.cache[symbol]
+
+
+def verify_stream(designs, chunk_size=STREAM_CHUNK_SIZE):
+    """Yields {'index', 'acceptable', 'governing'} for every design, in order.
+
+    The designs are verified in small batches, so the first results are available as soon
+    as the first batch is done and only one batch is held at a time. Call validate_designs()
+    first, an invalid design raises in the middle of the stream.
+    """
+
+    for start in range(0, len(designs), chunk_size):
+        batch = BatchVerifier(designs[start:start + chunk_size])
+        utilisations = batch.utilisations()
+        acceptable = utilisations['final'] < 100
+
+        for offset, governing in enumerate(batch.governing_checks(utilisations)):
+            yield {
+                'index': start + offset,
+                'acceptable': bool(acceptable[offset]),
+                'governing': governing,
+            }
+
+
+def verify_batch(designs, governing=False, incremental=False):
+    """(acceptable mask, governing checks) of the designs, the governing checks are None unless requested.
+
+    Incremental verifications share the check memo of the process.
+    """
+
+    batch = BatchVerifier(designs, check_memo if incremental else None)
+    if governing:
+        return batch.verify()
+    return batch.acceptable_mask(), None
+
+
+def verify_parallel(designs, workers=None, chunk_size=PARALLEL_CHUNK_SIZE, governing=False, incremental=False):
+    """verify_batch() of the designs, verified in chunks on the shared process pool, at most workers chunks at a time.
+
+    The results are in the order of the designs. A batch that fits in one chunk is verified
+    in this process.
+    """
+
+    chunk_size = max(int(chunk_size), 1)
+    if len(designs) <= chunk_size:
+        return verify_batch(designs, governing, incremental)
+
+    chunks = [designs[start:start + chunk_size] for start in range(0, len(designs), chunk_size)]
+    results = list(pool_map(partial(verify_batch, governing=governing, incremental=incremental), chunks, workers))
+
+    mask = np.concatenate([mask for mask, _ in results])
+    if not governing:
+        return mask, None
+    return mask, [check for _, checks in results for check in checks]